@@ -0,0 +1,61 @@
+"""Локальная замена FTP-сервера для замеров: pyftpdlib с задержкой на команду
+и счетчиком команд."""
+import logging
+import threading
+import time
+from collections import Counter
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.log import config_logging
+from pyftpdlib.servers import ThreadedFTPServer
+
+USER = 'bench'
+PASSWORD = 'bench'
+
+
+class BenchFtpServer:
+    def __init__(self, root, latency=0.0):
+        self.latency = latency
+        self.commands = Counter()
+        self.lock = threading.Lock()
+        self.server = None
+        self.port = None
+        self.root = root
+
+    def start(self):
+        authorizer = DummyAuthorizer()
+        authorizer.add_user(USER, PASSWORD, self.root, perm='elr')
+        bench = self
+
+        class SlowHandler(FTPHandler):
+            encoding = 'cp1251'
+            banner = 'bench'
+
+            def pre_process_command(self, line, cmd, arg):
+                with bench.lock:
+                    bench.commands[cmd] += 1
+                # ThreadedFTPServer: задержка блокирует только свое соединение
+                if bench.latency:
+                    time.sleep(bench.latency)
+                return super().pre_process_command(line, cmd, arg)
+
+        SlowHandler.authorizer = authorizer
+        config_logging(level=logging.WARNING)
+        self.server = ThreadedFTPServer(('127.0.0.1', 0), SlowHandler)
+        self.port = self.server.socket.getsockname()[1]
+        threading.Thread(target=self.server.serve_forever, kwargs={'handle_exit': False}, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f'ftp://127.0.0.1:{self.port}/'
+
+    def take_commands(self):
+        with self.lock:
+            commands = dict(self.commands)
+            self.commands.clear()
+        return commands
+
+    def stop(self):
+        self.server.close_all()
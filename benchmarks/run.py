@@ -0,0 +1,159 @@
+"""Замер полного прогона проверки на синтетическом дереве.
+
+Генерирует дерево ЭЧ с кириллическими именами, раздает его через локальный
+FTP (pyftpdlib) с задержкой на каждую команду и прогоняет сценарии от обхода
+до записи отчета. Каждый сценарий идет в отдельном процессе, чтобы пиковый
+RSS относился только к нему. Результат — JSON для отслеживания регрессий.
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/run.py --ech 10 --persons 8 --latency 0.02 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+SCENARIOS = ['local', 'ftp-threads', 'ftp-async']
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / 2 ** 20, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS — байты
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+def run_scenario(args):
+    """Выполняется в дочернем процессе: один прогон сценария, JSON в stdout."""
+    from inspection.engine import Scanner, scan_to_report
+    from inspection.metrics import ScanMetrics
+
+    metrics = ScanMetrics()
+    scanner = Scanner()
+    scanner.LISTING_CACHE_FILE = os.path.join(args.workdir, 'listing_cache.json')
+    output_file = os.path.join(args.workdir, f'report-{args.scenario}.xlsx')
+    force_rescan = args.cache == 'cold'
+
+    started = time.perf_counter()
+    if args.scenario == 'local':
+        rows = scan_to_report(scanner.process_local, output_file, args.tree, 'bench', force_rescan=force_rescan,
+                              metrics=metrics)
+    else:
+        from ftp_server import PASSWORD, USER
+        rows = scan_to_report(
+            scanner.process_ftp, output_file, args.url, 'bench', USER, PASSWORD,
+            max_connections=args.connections, force_rescan=force_rescan,
+            engine='async' if args.scenario == 'ftp-async' else 'threads', metrics=metrics
+        )
+    seconds = time.perf_counter() - started
+    print(json.dumps({'seconds': seconds, 'rows': sum(rows), 'peak_rss_mb': peak_rss_mb(),
+                      'phases': metrics.summary()['phases']}))
+
+
+def spawn(scenario, args, workdir, tree, url):
+    cmd = [
+        sys.executable, os.path.abspath(__file__), '--worker', scenario,
+        '--workdir', workdir, '--tree', tree, '--url', url or '',
+        '--connections', str(args.connections), '--cache', args.cache,
+    ]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True, encoding='utf-8').stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ech', type=int, default=5, help='число ЭЧ')
+    parser.add_argument('--persons', type=int, default=4, help='руководителей в ЭЧ')
+    parser.add_argument('--normativs', type=int, default=6, help='нормативов у руководителя')
+    parser.add_argument('--checks', type=int, default=4, help='максимум оперативных проверок')
+    parser.add_argument('--video-ratio', type=float, default=0.5, help='доля проверок с видео')
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка FTP на команду, с')
+    parser.add_argument('--connections', type=int, default=4, help='соединений FTP')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='через запятую: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--cache', choices=['cold', 'warm'], default='cold',
+                        help='cold — полный обход, warm — повторный прогон с кэшем листингов')
+    parser.add_argument('--repeat', type=int, default=1, help='повторов, берется лучший результат')
+    parser.add_argument('--output', help='записать JSON в файл (по умолчанию stdout)')
+    # служебные параметры дочернего процесса
+    parser.add_argument('--worker', choices=SCENARIOS, dest='scenario', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--tree', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        run_scenario(args)
+        return
+
+    from ftp_server import BenchFtpServer
+    from synthetic_tree import make_tree
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    with tempfile.TemporaryDirectory() as workdir:
+        tree = os.path.join(workdir, 'tree')
+        tree_stats = make_tree(tree, args.ech, args.persons, args.normativs, args.checks, args.video_ratio)
+        server = None
+        if any(s.startswith('ftp') for s in scenarios):
+            server = BenchFtpServer(tree, args.latency).start()
+
+        results = []
+        for scenario in scenarios:
+            url = server.url if server else None
+            if args.cache == 'warm':
+                spawn(scenario, args, workdir, tree, url)
+            best = None
+            for _ in range(args.repeat):
+                if server:
+                    server.take_commands()
+                run = spawn(scenario, args, workdir, tree, url)
+                run['ftp_commands'] = server.take_commands() if server and scenario != 'local' else {}
+                if best is None or run['seconds'] < best['seconds']:
+                    best = run
+            results.append({
+                'scenario': scenario,
+                'seconds': round(best['seconds'], 3),
+                'rows': best['rows'],
+                'rows_per_second': round(best['rows'] / best['seconds'], 1) if best['seconds'] else None,
+                'ftp_commands_total': sum(best['ftp_commands'].values()),
+                'ftp_commands': best['ftp_commands'],
+                'peak_rss_mb': best['peak_rss_mb'],
+                'phases': best['phases'],
+            })
+        if server:
+            server.stop()
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'tree': dict(tree_stats, ech=args.ech, persons=args.persons, normativs=args.normativs,
+                     checks=args.checks, video_ratio=args.video_ratio),
+        'latency': args.latency,
+        'connections': args.connections,
+        'cache': args.cache,
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Генератор синтетического дерева ЭЧ/руководитель/норматив/"оперативные проверки"/проверка.
+
+Все имена кириллические и представимы в cp1251, как на боевом Serv-U.
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inspection.engine import Scanner  # noqa: E402
+
+POSITIONS = ['ЭЧ', 'ЭЧЗ', 'ЭЧС', 'ЭЧ-%', 'ЭЧК', 'ЭЧЦ']
+SURNAMES = ['Иванов', 'Петров', 'Сидоров', 'Кузнецов', 'Смирнов', 'Соколов', 'Попов', 'Лебедев', 'Фёдоров']
+NORMATIVS = ['Осмотр контактной сети', 'Проверка тяговой подстанции', 'Охрана труда', 'Электробезопасность',
+             'Пожарная безопасность', 'Обход участка', 'Проверка знаний', 'Техническая учеба']
+MATERIALS = ['акт.pdf', 'протокол.docx', 'фото.jpg', 'ведомость.xlsx']
+
+
+def make_tree(root, ech_count=5, persons=4, normativs=6, checks=4, video_ratio=0.5, material_ratio=0.7, seed=1):
+    """Создает дерево в root и возвращает словарь с числом папок и файлов."""
+    rnd = random.Random(seed)
+    video_extensions = sorted(Scanner.VIDEO_EXTENSIONS)
+    folders = 0
+    files = 0
+
+    def touch(path, data=b''):
+        nonlocal files
+        with open(path, 'wb') as f:
+            f.write(data)
+        files += 1
+
+    for e in range(1, ech_count + 1):
+        ech = os.path.join(root, f'ЭЧ-{e}')
+        os.makedirs(ech, exist_ok=True)
+        folders += 1
+        for p in range(persons):
+            person = os.path.join(ech, f'{rnd.choice(POSITIONS)} {rnd.choice(SURNAMES)} {p + 1}')
+            os.makedirs(person, exist_ok=True)
+            folders += 1
+            for n in range(normativs):
+                normativ = os.path.join(person, f'{n + 1:02d} {NORMATIVS[n % len(NORMATIVS)]}')
+                os.makedirs(normativ, exist_ok=True)
+                folders += 1
+                if rnd.random() < material_ratio:
+                    touch(os.path.join(normativ, rnd.choice(MATERIALS)), b'%PDF')
+            operative = os.path.join(person, f'{normativs + 1:02d} Оперативные проверки')
+            os.makedirs(os.path.join(operative, '01.08 ЭЧК-№'), exist_ok=True)
+            folders += 2
+            for c in range(rnd.randint(0, checks)):
+                check = os.path.join(operative, f'{c + 1:02d}.{rnd.randint(1, 12):02d} Проверка ЭЧК-{c + 1}')
+                os.makedirs(check, exist_ok=True)
+                folders += 1
+                if rnd.random() < video_ratio:
+                    touch(os.path.join(check, f'запись{rnd.choice(video_extensions)}'), b'\0\0\0\x18ftypisom')
+                else:
+                    touch(os.path.join(check, 'акт проверки.pdf'), b'%PDF')
+    return {'folders': folders, 'files': files}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Создать синтетическое дерево для замеров')
+    parser.add_argument('root')
+    parser.add_argument('--ech', type=int, default=5)
+    parser.add_argument('--persons', type=int, default=4)
+    parser.add_argument('--normativs', type=int, default=6)
+    parser.add_argument('--checks', type=int, default=4)
+    parser.add_argument('--video-ratio', type=float, default=0.5)
+    args = parser.parse_args()
+    print(make_tree(args.root, args.ech, args.persons, args.normativs, args.checks, args.video_ratio))
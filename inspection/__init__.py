@@ -0,0 +1,18 @@
+"""Проверка нормативов и оперативных проверок: движок без Qt и CLI.
+
+Пример запуска из планировщика:
+
+    python -m inspection --source ftp --path ftp://host:8021/Нормативы --month "май 2024"
+
+Пакет источников и месяцев за один запуск (см. inspection.batch):
+
+    python -m inspection --batch batch.json
+"""
+from .batch import load_batch, run_batch
+from .engine import Scanner, make_frames, scan_to_report
+from .report import open_report, save_report
+from .summary import summary_frames
+from .traversal import MemoryBackend, TreeWalker
+
+__all__ = ['Scanner', 'make_frames', 'scan_to_report', 'open_report', 'save_report', 'summary_frames', 'load_batch',
+           'run_batch', 'MemoryBackend', 'TreeWalker']
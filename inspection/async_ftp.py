@@ -0,0 +1,336 @@
+"""Асинхронный обход FTP на asyncio.
+
+Вместо потока на соединение держит много запросов листинга в работе поверх
+небольшого числа управляющих соединений. Общее число запросов ограничено
+семафором, число соединений к серверу — отдельным лимитом. PASV и команда
+листинга отправляются одним пакетом, без ожидания ответа на PASV.
+"""
+import asyncio
+import re
+import time
+from ftplib import Error, error_perm, error_reply, error_temp, parse257
+
+from .ftp import is_session_limit, parse_list_line, parse_mlsd_line
+
+PASV_RE = re.compile(r'(\d+),(\d+),(\d+),(\d+),(\d+),(\d+)')
+
+
+class AsyncFtpConnection:
+    """Одно управляющее соединение FTP; команды по нему идут строго по очереди."""
+
+    def __init__(self, host: str, port: int, encoding='cp1251', timeout=30, metrics=None):
+        self.host = host
+        self.metrics = metrics
+        self.port = port
+        self.encoding = encoding
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.pipeline = True
+
+    async def connect(self, ftp_login: str, ftp_password: str):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        # приветствие 421 — отказ по лимиту сессий, как в ftplib.FTP.connect
+        self.check_reply(await self.read_reply(), '2')
+        resp = await self.command(f'USER {ftp_login}', expect='23')
+        if resp.startswith('3'):
+            await self.command(f'PASS {ftp_password}', expect='2')
+
+    async def send(self, line: str):
+        if self.metrics is not None:
+            self.metrics.command(line)
+        self.writer.write(f'{line}\r\n'.encode(self.encoding))
+        await self.writer.drain()
+
+    async def read_line(self):
+        line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+        if not line:
+            raise EOFError('Соединение закрыто сервером')
+        return line.decode(self.encoding, errors='replace').rstrip('\r\n')
+
+    async def read_reply(self):
+        first = await self.read_line()
+        lines = [first]
+        if first[3:4] == '-':
+            code = first[:3]
+            while True:
+                line = await self.read_line()
+                lines.append(line)
+                if line[:3] == code and line[3:4] != '-':
+                    break
+        return '\n'.join(lines)
+
+    @staticmethod
+    def check_reply(resp: str, expect: str):
+        if resp[:1] in expect:
+            return resp
+        if resp[:1] == '4':
+            raise error_temp(resp)
+        if resp[:1] == '5':
+            raise error_perm(resp)
+        raise error_reply(resp)
+
+    async def command(self, line: str, expect='2'):
+        await self.send(line)
+        return self.check_reply(await self.read_reply(), expect)
+
+    async def supports_mlsd(self):
+        try:
+            resp = await self.command('FEAT')
+        except Error:
+            return False
+        if not any(line.strip().upper().startswith('MLST') for line in resp.splitlines()[1:]):
+            return False
+        try:
+            await self.command('OPTS MLST type;size;modify;')
+        except Error:
+            pass
+        return True
+
+    async def pwd(self):
+        return parse257(await self.command('PWD'))
+
+    async def open_data(self, resp: str):
+        match = PASV_RE.search(resp)
+        if not match:
+            raise error_reply(resp)
+        numbers = [int(n) for n in match.groups()]
+        # Как и ftplib, адрес из ответа PASV не используем — только порт
+        port = (numbers[4] << 8) + numbers[5]
+        return await asyncio.wait_for(asyncio.open_connection(self.host, port), self.timeout)
+
+    async def retrlines(self, cmd: str):
+        if self.pipeline:
+            # PASV и команда листинга уходят одним пакетом: сервер ставит
+            # передачу в очередь до подключения канала данных
+            if self.metrics is not None:
+                self.metrics.command('PASV')
+                self.metrics.command(cmd)
+            self.writer.write(f'PASV\r\n{cmd}\r\n'.encode(self.encoding))
+            await self.writer.drain()
+            pasv = await self.read_reply()
+            if not pasv.startswith('2'):
+                # ответ на саму команду листинга тоже нужно вычитать
+                await self.read_reply()
+                self.pipeline = False
+                return await self.retrlines(cmd)
+        else:
+            pasv = await self.command('PASV')
+        data_reader, data_writer = await self.open_data(pasv)
+        try:
+            if not self.pipeline:
+                await self.send(cmd)
+            self.check_reply(await self.read_reply(), '1')
+            chunks = []
+            while True:
+                chunk = await asyncio.wait_for(data_reader.read(65536), self.timeout)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        finally:
+            data_writer.close()
+        self.check_reply(await self.read_reply(), '2')
+        return b''.join(chunks).decode(self.encoding, errors='replace').splitlines()
+
+    async def timed_retrlines(self, cmd: str, path: str):
+        started = time.perf_counter()
+        lines = await self.retrlines(f'{cmd} {path}')
+        if self.metrics is not None:
+            self.metrics.listing(path, time.perf_counter() - started, sum(len(line) + 2 for line in lines))
+        return lines
+
+    async def list_dir(self, path: str, use_mlsd: bool):
+        if use_mlsd:
+            return [entry for entry in map(parse_mlsd_line, await self.timed_retrlines('MLSD', path)) if entry]
+        entries = []
+        for line in await self.timed_retrlines('LIST', path):
+            entry = parse_list_line(line)
+            if entry and entry.name not in ('.', '..'):
+                entries.append(entry)
+        return entries
+
+    async def read_header(self, path: str, nbytes: int) -> bytes:
+        """Первые nbytes файла: RETR в двоичном режиме с закрытием канала
+        данных после заголовка, затем возврат к TYPE A для листингов."""
+        await self.command('TYPE I')
+        try:
+            data_reader, data_writer = await self.open_data(await self.command('PASV'))
+            chunks = []
+            received = 0
+            try:
+                await self.send(f'RETR {path}')
+                self.check_reply(await self.read_reply(), '1')
+                while received < nbytes:
+                    chunk = await asyncio.wait_for(data_reader.read(nbytes - received), self.timeout)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    received += len(chunk)
+            finally:
+                data_writer.close()
+            try:
+                self.check_reply(await self.read_reply(), '2')
+            except error_temp:
+                pass  # 426/451: сервер сообщает об оборванной передаче
+        finally:
+            await self.command('TYPE A')
+        return b''.join(chunks)
+
+    async def close(self):
+        if self.writer is None:
+            return
+        try:
+            await asyncio.wait_for(self.command('QUIT'), 5)
+        except (Error, OSError, EOFError, asyncio.TimeoutError):
+            pass
+        self.writer.close()
+        self.writer = None
+
+
+class AsyncFtpPool:
+    """Пул соединений к одному серверу с ограничением числа соединений
+    и общим семафором на количество запросов в работе.
+
+    С controller (inspection.concurrency.ConcurrencyController) предел
+    соединений берется из него и меняется по ходу прогона. Чтений заголовков
+    файлов одновременно не больше header_reads.
+    """
+
+    def __init__(self, host, port, ftp_login, ftp_password, max_connections, semaphore, use_mlsd=False,
+                 metrics=None, controller=None, header_reads=1):
+        self.host = host
+        self.metrics = metrics
+        self.port = port
+        self.ftp_login = ftp_login
+        self.ftp_password = ftp_password
+        self.max_connections = max(1, max_connections)
+        self.semaphore = semaphore
+        self.controller = controller
+        self.header_slots = asyncio.Semaphore(max(1, header_reads))
+        self.use_mlsd = use_mlsd
+        self.idle = asyncio.Queue()
+        self.opened = 0
+        self.connections = []
+
+    async def new_connection(self):
+        conn = AsyncFtpConnection(self.host, self.port, metrics=self.metrics)
+        self.opened += 1
+        started = time.perf_counter()
+        try:
+            await conn.connect(self.ftp_login, self.ftp_password)
+        except BaseException as e:
+            self.opened -= 1
+            self.idle.put_nowait(None)
+            self.back_off(e)
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.add_phase('connect', time.perf_counter() - started)
+        self.connections.append(conn)
+        if self.controller is not None:
+            self.controller.confirm(len(self.connections))
+        return conn
+
+    def adopt(self, conn):
+        """Добавляет в пул уже подключенное соединение."""
+        self.opened += 1
+        self.connections.append(conn)
+        self.release(conn)
+
+    async def refresh(self, metrics):
+        """Перед следующим прогоном пакета: замеры идут в metrics, а соединения,
+        закрытые сервером за время простоя, отбрасываются."""
+        self.metrics = metrics
+        idle = []
+        while not self.idle.empty():
+            conn = self.idle.get_nowait()
+            if conn is not None:
+                conn.metrics = metrics
+                idle.append(conn)
+
+        async def probe(conn):
+            try:
+                await conn.command('NOOP')
+            except (Error, OSError, EOFError, asyncio.TimeoutError):
+                self.discard(conn)
+            else:
+                self.idle.put_nowait(conn)
+        await asyncio.gather(*(probe(conn) for conn in idle))
+
+    @property
+    def limit(self):
+        return self.controller.limit if self.controller is not None else self.max_connections
+
+    def back_off(self, error):
+        if self.controller is not None and (is_session_limit(error) or isinstance(error, asyncio.TimeoutError)):
+            # в connections — только вошедшие сессии, отказавшая к ним добавляется
+            self.controller.back_off('session limit' if is_session_limit(error) else 'timeout',
+                                     sessions=len(self.connections) + 1)
+
+    async def acquire(self):
+        while True:
+            if self.idle.empty() and self.opened < self.limit:
+                return await self.new_connection()
+            conn = await self.idle.get()
+            if conn is not None:
+                return conn
+            # None — освободилось место потерянного соединения
+
+    def release(self, conn):
+        if self.opened > self.limit:
+            # предел снизился: лишнее соединение закрывается
+            self.discard(conn)
+        else:
+            self.idle.put_nowait(conn)
+
+    def discard(self, conn):
+        self.opened -= 1
+        if conn in self.connections:
+            self.connections.remove(conn)
+        if conn.writer is not None:
+            conn.writer.close()
+            conn.writer = None
+        self.idle.put_nowait(None)
+
+    async def list_dir(self, path: str):
+        return await self.call(lambda conn: conn.list_dir(path, self.use_mlsd))
+
+    async def read_header(self, path: str, nbytes: int):
+        async with self.header_slots:
+            return await self.call(lambda conn: conn.read_header(path, nbytes))
+
+    async def call(self, operation):
+        """operation(conn) на свободном соединении пула."""
+        async with self.semaphore:
+            conn = await self.acquire()
+            if self.controller is not None:
+                self.controller.track(1)
+            try:
+                result = await operation(conn)
+            except (OSError, EOFError, asyncio.TimeoutError) as e:
+                # соединение потеряно, в пул его не возвращаем
+                self.discard(conn)
+                self.back_off(e)
+                raise
+            except Error as e:
+                if not is_session_limit(e):
+                    self.release(conn)
+                    raise
+                # 421: сервер закрывает соединение
+                self.discard(conn)
+                self.back_off(e)
+                raise
+            except BaseException:
+                self.release(conn)
+                raise
+            finally:
+                if self.controller is not None:
+                    self.controller.track(-1)
+            self.release(conn)
+            return result
+
+    async def close(self):
+        await asyncio.gather(*(conn.close() for conn in self.connections))
+        self.connections = []
@@ -0,0 +1,245 @@
+"""Пакетная проверка: несколько корней (FTP и локальных) за несколько месяцев
+одним запуском.
+
+Файл задания — JSON:
+
+    {
+        "sources": [
+            "ftp://10.1.0.5:8021/Нормативы",
+            {"path": "ftp://10.2.0.7/Нормативы/{month}", "name": "Юг", "login": "audit", "password": "..."},
+            {"path": "D:/Проверки/Север", "months": ["май 2024"]}
+        ],
+        "months": ["апрель 2024", "май 2024"],
+        "outputs": ["Проверки {month} {name}.xlsx", "Проверки {month} {name}.parquet"],
+        "parallel": 4
+    }
+
+Задание — каждое сочетание источника и месяца; в пути источника и именах
+отчетов подставляются {month} и {name}. У источника можно переопределить
+months, outputs, login, password, engine и connections; логин и пароль по
+умолчанию — из ftp_credentials.txt.
+
+Задания одного сервера FTP (или одной локальной папки) идут по очереди в
+одной группе: авторизованные соединения и подобранный уровень параллельности
+переходят от задания к заданию (FtpSession), а листинги, уже полученные по
+тому же дереву, служат кэшем следующим заданиям (ListingStore). Группы идут
+параллельно, не больше parallel одновременно.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import queue
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from ftplib import all_errors
+
+from .engine import Scanner, read_ftp_credentials, scan_to_report
+from .listing import ListingStore
+from .metrics import ScanMetrics
+from .report import REPORT_WRITERS
+from .snapshot import ScanSnapshot
+
+DEFAULT_OUTPUT = 'Проверки {month} {name}.xlsx'
+BATCH_PARALLEL = 4
+
+BatchJob = namedtuple('BatchJob', ['source', 'month', 'name', 'outputs', 'login', 'password', 'engine',
+                                   'connections'])
+BatchResult = namedtuple('BatchResult', ['job', 'rows', 'error', 'metrics'])
+
+
+class FtpSession:
+    """Соединения к одному серверу, общие для заданий пакета.
+
+    Потоковый движок забирает свободные соединения в начале прогона
+    (drain) и возвращает их в конце (keep); пул asyncio живет в собственном
+    цикле событий сессии (run). home — начальная папка после входа: с нее
+    начинается навигация следующего прогона.
+    """
+
+    def __init__(self):
+        self.idle = queue.Queue()
+        self.controller = None
+        self.home = None
+        self.async_pool = None
+        self.loop = None
+
+    def drain(self, metrics):
+        """Живые свободные соединения (FtpLister) с замерами в metrics;
+        закрытые сервером за время простоя отбрасываются."""
+        conns = []
+        while not self.idle.empty():
+            conn = self.idle.get_nowait()
+            conn.bind(metrics)
+            try:
+                conn.ftp.voidcmd('NOOP')
+            except all_errors:
+                conn.ftp.close()
+                continue
+            conns.append(conn)
+        return conns
+
+    def keep(self, conn):
+        self.idle.put(conn)
+
+    def run(self, coro):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(coro)
+
+    def close(self):
+        while not self.idle.empty():
+            conn = self.idle.get_nowait().ftp
+            try:
+                conn.quit()
+            except all_errors:
+                conn.close()
+        if self.loop is not None:
+            if self.async_pool is not None:
+                self.loop.run_until_complete(self.async_pool.close())
+            self.loop.close()
+            self.loop = None
+
+
+def load_batch(file_path: str):
+    """Задания пакета из файла JSON: ([BatchJob], parallel)."""
+    try:
+        with open(file_path, encoding='utf-8') as f:
+            spec = json.load(f)
+    except ValueError as e:
+        raise ValueError(f"Файл задания {file_path} не разобран: {e}")
+    return batch_jobs(spec)
+
+
+def batch_jobs(spec):
+    if not isinstance(spec, dict) or not spec.get('sources'):
+        raise ValueError("В задании нет списка sources")
+    ftp_login, ftp_password = read_ftp_credentials()
+    jobs = []
+    for source in spec['sources']:
+        if isinstance(source, str):
+            source = {'path': source}
+        if not source.get('path'):
+            raise ValueError(f"У источника нет path: {source}")
+        months = source.get('months', spec.get('months'))
+        if not months:
+            raise ValueError(f"Не заданы месяцы для {source['path']}")
+        outputs = source.get('outputs', spec.get('outputs', [DEFAULT_OUTPUT]))
+        if isinstance(outputs, str):
+            outputs = [outputs]
+        for month in months:
+            path = source['path'].replace('{month}', month)
+            name = source.get('name') or source_name(path)
+            jobs.append(BatchJob(
+                source=path,
+                month=month,
+                name=name,
+                outputs=[os.path.abspath(output.format(month=month, name=name)) for output in outputs],
+                login=source.get('login', ftp_login),
+                password=source.get('password', ftp_password),
+                engine=source.get('engine'),
+                connections=source.get('connections'),
+            ))
+    check_outputs(jobs)
+    return (jobs, max(1, int(spec.get('parallel', BATCH_PARALLEL))))
+
+
+def source_name(path: str) -> str:
+    """Имя источника для {name}: хост и последняя папка FTP URL или последняя папка локального пути."""
+    if is_ftp(path):
+        host, _, ftp_path = Scanner().parse_ftp_url_with_cyrillic(path)
+        folder = ftp_path.rstrip('/').rpartition('/')[2]
+        return f"{host} {folder}" if folder else host
+    return os.path.basename(os.path.normpath(path)) or path
+
+
+def check_outputs(jobs):
+    seen = {}
+    for job in jobs:
+        for output in job.outputs:
+            ext = os.path.splitext(output)[1].lower()
+            if ext not in REPORT_WRITERS:
+                raise ValueError(f"Неизвестный формат отчета: {output} (поддерживаются .xlsx, .csv, .parquet)")
+            if output in seen:
+                raise ValueError(f"Задания {seen[output]} и {job.source} ({job.month}) пишут в один файл {output}; "
+                                 f"добавьте {{name}} или {{month}} в имя отчета")
+            seen[output] = f"{job.source} ({job.month})"
+
+
+def is_ftp(path: str) -> bool:
+    return path.lower().startswith('ftp://')
+
+
+def job_group(job: BatchJob):
+    """Задания одной группы идут по очереди: одна сессия FTP на сервер и логин,
+    одна группа на локальную папку."""
+    if is_ftp(job.source):
+        host, port, _ = Scanner().parse_ftp_url_with_cyrillic(job.source)
+        return f"{job.login}@{host}:{port}"
+    return os.path.abspath(job.source)
+
+
+def job_journal(job: BatchJob, journal_file=Scanner.JOURNAL_FILE) -> str:
+    """Свой журнал прерванного прогона на каждое задание: параллельные группы
+    не затирают журналы друг друга, а повторный запуск пакета продолжает каждое
+    задание с места остановки."""
+    stem, ext = os.path.splitext(journal_file)
+    digest = hashlib.sha1(f"{job.source}|{job.month}".encode('utf-8')).hexdigest()[:10]
+    return f"{stem}-{digest}{ext}"
+
+
+def run_batch(jobs, parallel=BATCH_PARALLEL, scanner_factory=Scanner, force_rescan=False, summary=True,
+              snapshot_file=None, on_result=None, hooks=None):
+    """Выполняет задания пакета; возвращает [BatchResult] в порядке заданий.
+
+    on_result(BatchResult) вызывается по завершении каждого задания (из
+    потока его группы), hooks — обработчики ScanMetrics каждого прогона.
+    """
+    groups = {}
+    for index, job in enumerate(jobs):
+        groups.setdefault(job_group(job), []).append(index)
+    results = [None] * len(jobs)
+    store = ListingStore(scanner_factory().LISTING_CACHE_FILE, force=force_rescan)
+    snapshot = ScanSnapshot(snapshot_file, deferred=True) if snapshot_file else None
+
+    def run_group(indexes):
+        scanner = scanner_factory()
+        session = FtpSession()
+        try:
+            for index in indexes:
+                result = run_job(scanner, jobs[index], session, store, snapshot, force_rescan, summary, hooks)
+                results[index] = result
+                if on_result is not None:
+                    on_result(result)
+        finally:
+            session.close()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(groups)))) as executor:
+            for future in [executor.submit(run_group, indexes) for indexes in groups.values()]:
+                future.result()
+    finally:
+        if snapshot is not None:
+            snapshot.close()
+    return results
+
+
+def run_job(scanner: Scanner, job: BatchJob, session: FtpSession, store: ListingStore, snapshot, force_rescan,
+            summary, hooks=None):
+    metrics = ScanMetrics(hooks=hooks)
+    scanner.JOURNAL_FILE = job_journal(job, type(scanner).JOURNAL_FILE)
+    try:
+        if is_ftp(job.source):
+            rows = scan_to_report(
+                scanner.process_ftp, job.outputs, job.source, job.month, job.login, job.password,
+                max_connections=job.connections, force_rescan=force_rescan, engine=job.engine, metrics=metrics,
+                snapshot=snapshot, summary=summary, session=session, listing_store=store
+            )
+        else:
+            rows = scan_to_report(
+                scanner.process_local, job.outputs, job.source, job.month, force_rescan=force_rescan,
+                metrics=metrics, snapshot=snapshot, summary=summary, listing_store=store
+            )
+    except Exception as e:
+        return BatchResult(job, None, e, metrics)
+    return BatchResult(job, rows, None, metrics)
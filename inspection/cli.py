@@ -0,0 +1,265 @@
+import argparse
+import json
+import sys
+import time
+
+from .batch import load_batch, run_batch
+from .engine import (
+    METRICS_FILE,
+    MONTH_FILE,
+    PATH_FILE,
+    SNAPSHOT_FILE,
+    Scanner,
+    default_output_file,
+    read_file_with_encoding,
+    read_ftp_credentials,
+    scan_to_report,
+    snapshot_root,
+    snapshot_to_report,
+)
+from .listing import ListingCache
+from .metrics import ScanMetrics
+from .snapshot import ScanSnapshot
+from .video import VIDEO_VALIDATION_MODES
+from .watch import LocalWatcher
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='inspection',
+        description='Проверка нормативов и оперативных проверок без графического интерфейса.'
+    )
+    parser.add_argument('--source', choices=['local', 'ftp'], default='local',
+                        help='тип источника: локальная папка или FTP сервер')
+    parser.add_argument('--path', help=f'путь к папке или FTP URL (по умолчанию из {PATH_FILE})')
+    parser.add_argument('--month', help=f'месяц и год, например "май 2024" (по умолчанию из {MONTH_FILE})')
+    parser.add_argument('--out', help='файл отчета: .xlsx, .csv или .parquet '
+                                      '(по умолчанию "Проверки <месяц>.xlsx" в текущей папке)')
+    parser.add_argument('--login', help='логин FTP (по умолчанию из ftp_credentials.txt)')
+    parser.add_argument('--password', help='пароль FTP (по умолчанию из ftp_credentials.txt)')
+    parser.add_argument('--connections', type=int, default=None,
+                        help='число соединений FTP (по умолчанию подбирается по задержке и отказам сервера, '
+                             f'начиная с {Scanner.FTP_MAX_CONNECTIONS}; см. {Scanner.CONCURRENCY_FILE})')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='потоков локального обхода (по умолчанию подбирается по типу диска)')
+    parser.add_argument('--engine', choices=['threads', 'async'], default=None,
+                        help=f'движок обхода FTP (по умолчанию {Scanner.FTP_ENGINE})')
+    parser.add_argument('--recursive', action='store_true',
+                        help='получать дерево ЭЧ рекурсивным листингом (LIST -R / STAT -R)')
+    parser.add_argument('--video-check', choices=VIDEO_VALIDATION_MODES, default=None,
+                        help='проверка видео: по расширению, еще и по размеру из листинга или еще и по '
+                             f'сигнатуре в начале файла (по умолчанию {Scanner.VIDEO_VALIDATION})')
+    parser.add_argument('--full-rescan', action='store_true',
+                        help='игнорировать кэш листингов и журнал прерванного прогона FTP')
+    parser.add_argument('--metrics', default=METRICS_FILE,
+                        help=f'файл JSON с замерами прогона (по умолчанию {METRICS_FILE}, "-" — не сохранять)')
+    parser.add_argument('--no-summary', dest='summary', action='store_false',
+                        help='не добавлять в отчет сводные листы по ЭЧ, руководителям и нормативам')
+    parser.add_argument('--live', action='store_true',
+                        help='печатать в stderr время обработки каждой ЭЧ по ходу обхода')
+    parser.add_argument('--watch', action='store_true',
+                        help='после проверки следить за локальной папкой и обновлять отчет при изменениях')
+    parser.add_argument('--batch', metavar='ФАЙЛ',
+                        help='пакет заданий JSON: несколько источников и месяцев за один запуск '
+                             '(см. inspection.batch); --path, --month и --out не нужны')
+    parser.add_argument('--evict-cache', action='store_true',
+                        help=f'удалить из кэша листингов {Scanner.LISTING_CACHE_FILE} области корня --path '
+                             'и/или месяца --month (без них — весь кэш) и завершить работу')
+    parser.add_argument('--snapshot', default=SNAPSHOT_FILE,
+                        help=f'файл снимков SQLite (по умолчанию {SNAPSHOT_FILE}, "-" — не сохранять)')
+    query = parser.add_argument_group('запросы к снимку (без обхода папок)')
+    query.add_argument('--from-snapshot', action='store_true',
+                       help='построить отчет --out по снимку месяца')
+    query.add_argument('--missing-video', nargs='?', const='', metavar='ЭЧ',
+                       help='вывести проверки без видео (во всех ЭЧ или в указанной)')
+    query.add_argument('--diff', nargs='?', const='', metavar='МЕСЯЦ',
+                       help='сравнить месяц с указанным (по умолчанию — с предыдущим снимком)')
+    return parser
+
+
+def make_scanner(args):
+    scanner = Scanner()
+    if args.video_check:
+        scanner.VIDEO_VALIDATION = args.video_check
+    return scanner
+
+
+def watch_local(scanner, path, month, output_file, summary=True):
+    def on_update(check_data, normativ_data):
+        try:
+            watcher.export(output_file, summary)
+        except Exception as e:
+            print(f"Ошибка при сохранении отчета: {e}", file=sys.stderr)
+            return
+        print(f"{time.strftime('%H:%M:%S')} отчет обновлен: оперативных {len(check_data)}, "
+              f"нормативов {len(normativ_data)} — {output_file}", flush=True)
+
+    watcher = LocalWatcher(scanner, path, month, on_update=on_update)
+    with watcher:
+        print("Слежение за изменениями, остановка — Ctrl+C", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def run_batch_file(args):
+    jobs, parallel = load_batch(args.batch)
+
+    def on_result(result):
+        job = result.job
+        if result.error is not None:
+            print(f"Ошибка: {job.source} ({job.month}): {result.error}", file=sys.stderr, flush=True)
+            return
+        print(f"{job.source} ({job.month}): оперативных {result.rows[0]}, нормативов {result.rows[1]} "
+              f"за {result.metrics.wall_seconds:.2f} с — {', '.join(job.outputs)}", flush=True)
+
+    results = run_batch(
+        jobs,
+        parallel,
+        scanner_factory=lambda: make_scanner(args),
+        force_rescan=args.full_rescan,
+        summary=args.summary,
+        snapshot_file=None if args.snapshot == '-' else args.snapshot,
+        on_result=on_result,
+        hooks=[print_live] if args.live else None,
+    )
+    if args.metrics != '-':
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            json.dump([{'name': result.job.name, 'error': None if result.error is None else str(result.error),
+                        **result.metrics.summary()} for result in results], f, ensure_ascii=False, indent=2)
+    failed = sum(1 for result in results if result.error is not None)
+    print(f"Заданий выполнено: {len(results) - failed} из {len(results)}")
+    return 1 if failed else 0
+
+
+def run_query(args, month):
+    root = snapshot_root(args.path.strip()) if args.path else None
+    with ScanSnapshot(args.snapshot) as snapshot:
+        if args.missing_video is not None:
+            for ech, person, normativ, check in snapshot.missing_video(month, args.missing_video or None, root):
+                print(f"{ech}\t{person}\t{normativ}\t{check}")
+        if args.diff is not None:
+            previous = args.diff or snapshot.previous_month(month, root)
+            if not previous:
+                raise ValueError(f"Нет снимка месяца раньше {month}")
+            print(f"Изменения: {previous} → {month}")
+            for sheet, ech, person, normativ, before, after in snapshot.diff(month, previous, root):
+                print(f"{sheet}\t{ech}\t{person}\t{normativ}\t"
+                      f"{'—' if before is None else before} → {'—' if after is None else after}")
+
+
+def evict_cache(args):
+    # корень и месяц берутся только из аргументов: без них очищается весь кэш
+    root = snapshot_root(args.path.strip()) if args.path else None
+    month = args.month.strip() if args.month else None
+    try:
+        removed = ListingCache.evict(Scanner.LISTING_CACHE_FILE, root, month)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка при очистке кэша листингов: {e}", file=sys.stderr)
+        return 1
+    print(f"Удалено областей кэша листингов: {removed}")
+    return 0
+
+
+def print_live(event, data):
+    if event == 'ech':
+        print(f"{data['ech']}: {data['seconds']:.2f} с", file=sys.stderr, flush=True)
+
+
+def print_summary(metrics: ScanMetrics):
+    summary = metrics.summary()
+    phases = ', '.join(f"{name} {seconds:.2f} с" for name, seconds in summary['phases'].items())
+    print(f"Фазы: {phases}", file=sys.stderr)
+    print(f"Листингов: {summary['listings']} ({summary['listing_bytes']} байт), "
+          f"команд FTP: {summary['ftp_commands_total']}", file=sys.stderr)
+    if 'concurrency' in summary:
+        level = summary['concurrency']
+        print(f"Соединений FTP: {level['best']} (начало {level['initial']}, максимум {level['peak']}, "
+              f"отказов сервера {level['backoffs']})", file=sys.stderr)
+    for item in summary['slowest_dirs'][:3]:
+        print(f"  медленная папка: {item['path']} — {item['seconds']:.2f} с", file=sys.stderr)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.batch:
+        try:
+            return run_batch_file(args)
+        except Exception as e:
+            print(f"Ошибка при выполнении: {e}", file=sys.stderr)
+            return 1
+    if args.evict_cache:
+        return evict_cache(args)
+    month = (args.month or read_file_with_encoding(MONTH_FILE)).strip()
+    if not month:
+        print("Ошибка: укажите месяц и год (--month)", file=sys.stderr)
+        return 2
+    output_file = args.out or default_output_file(month)
+
+    if args.missing_video is not None or args.diff is not None or args.from_snapshot:
+        if args.snapshot == '-':
+            print("Ошибка: запросы к снимку требуют файла --snapshot", file=sys.stderr)
+            return 2
+        try:
+            run_query(args, month)
+            if args.from_snapshot:
+                snapshot_to_report(args.snapshot, month, output_file,
+                                   snapshot_root(args.path.strip()) if args.path else None, args.summary)
+                print(f"Отчет построен по снимку: {output_file}")
+        except Exception as e:
+            print(f"Ошибка при выполнении: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    path = (args.path or read_file_with_encoding(PATH_FILE)).strip()
+    if not path:
+        print("Ошибка: укажите путь к папке или FTP URL (--path)", file=sys.stderr)
+        return 2
+    snapshot_file = None if args.snapshot == '-' else args.snapshot
+    if args.watch:
+        if args.source != 'local':
+            print("Ошибка: слежение (--watch) доступно только для локальной папки", file=sys.stderr)
+            return 2
+        try:
+            return watch_local(make_scanner(args), path, month, output_file, args.summary)
+        except Exception as e:
+            print(f"Ошибка при выполнении: {e}", file=sys.stderr)
+            return 1
+
+    started = time.time()
+    scanner = make_scanner(args)
+    metrics = ScanMetrics(hooks=[print_live] if args.live else None)
+    try:
+        if args.source == 'ftp':
+            ftp_login, ftp_password = read_ftp_credentials()
+            scan_to_report(
+                scanner.process_ftp,
+                output_file,
+                path,
+                month,
+                args.login if args.login is not None else ftp_login,
+                args.password if args.password is not None else ftp_password,
+                max_connections=args.connections,
+                recursive=True if args.recursive else None,
+                force_rescan=args.full_rescan,
+                engine=args.engine,
+                metrics=metrics,
+                snapshot_file=snapshot_file,
+                summary=args.summary
+            )
+        else:
+            scan_to_report(scanner.process_local, output_file, path, month, force_rescan=args.full_rescan,
+                           metrics=metrics, max_workers=args.workers, snapshot_file=snapshot_file,
+                           summary=args.summary)
+    except Exception as e:
+        print(f"Ошибка при выполнении: {e}", file=sys.stderr)
+        return 1
+
+    print_summary(metrics)
+    if args.metrics != '-':
+        metrics.save(args.metrics)
+    print(f"Выполнено за {round(time.time() - started, 2)} секунд! Сохранено в: {output_file}")
+    return 0
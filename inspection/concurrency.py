@@ -0,0 +1,238 @@
+"""Подбор числа одновременных соединений FTP под ограничения сервера.
+
+Serv-U ограничивает число сессий на пользователя и на IP и сверх лимита
+отвечает 421 (или 530 при входе). Контроллер начинает с уровня, который
+лучше всего работал с этим сервером в прошлый раз, и добавляет по одному
+соединению, пока медианная задержка листинга остается в пределах
+TOLERANCE от задержки на исходном уровне. Если задержка выросла, уровень
+снижается на шаг и до конца прогона не растет. На отказ по лимиту сессий
+или таймаут уровень делится пополам. Отказ по лимиту делает потолком число
+сессий, которые были открыты к моменту отказа; таймаут ограничивает уровень
+только в этом прогоне. Лучший уровень и потолок сохраняются по хосту в файл
+Scanner.CONCURRENCY_FILE и служат началом следующего прогона; потолок старше
+CEILING_TTL забывается, и уровень выше него пробуется заново.
+"""
+import json
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+# прогоны пакета по разным серверам сохраняют свои уровни в один файл
+SAVE_LOCK = threading.Lock()
+
+# через сколько секунд сохраненный потолок перестает действовать: лимит
+# сессий на сервере могли поднять, а кратковременный отказ — не повторится
+CEILING_TTL = 7 * 24 * 3600
+STAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+class ConcurrencyController:
+    """Счетный семафор с изменяемым пределом limit.
+
+    observe(seconds) получает задержку каждого листинга, back_off() вызывается
+    на отказ сервера. При adaptive=False предел только снижается при отказах.
+    """
+
+    SAMPLES = 32  # листингов в окне, по медиане которого принимается решение
+    TOLERANCE = 1.3  # во сколько раз медиана может превысить точку отсчета
+    SMOOTHING = 0.3
+    STRIKES = 2  # окон подряд с ростом задержки, после которых уровень снижается
+    COOLDOWN = 2.0  # отказы одной волны снижают уровень один раз
+
+    def __init__(self, initial, maximum, minimum=1, adaptive=True, ceiling=None, ceiling_at=None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        # потолок по отказам сервера сохраняется между прогонами (ceiling_at —
+        # время отказа), cap по росту задержки и таймаутам действует только в
+        # этом прогоне
+        self.ceiling = ceiling
+        self.ceiling_at = ceiling_at if ceiling is not None else None
+        self.cap = None
+        self.limit = max(self.minimum, min(initial, self.upper()))
+        self.adaptive = adaptive
+        self.initial = self.limit
+        self.best = self.limit
+        self.peak = self.limit
+        self.baseline = None
+        self.baseline_level = None
+        self.settling = True
+        self.strikes = 0
+        self.samples = []
+        self.active = 0
+        self.backoffs = 0
+        self.last_backoff = None
+        self.started = time.perf_counter()
+        self.history = [(0.0, self.limit, 'start')]
+        self.cond = threading.Condition()
+
+    # ---------- слоты ----------
+    def acquire(self):
+        with self.cond:
+            while self.active >= self.limit:
+                self.cond.wait()
+            self.active += 1
+
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def track(self, delta):
+        """Учет занятых соединений без ожидания: для пула asyncio, который
+        сам держит число соединений в пределе."""
+        with self.cond:
+            self.active += delta
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    # ---------- обратная связь ----------
+    def observe(self, seconds):
+        with self.cond:
+            self.samples.append(seconds)
+            if not self.adaptive or len(self.samples) < self.SAMPLES:
+                return
+            median = statistics.median(self.samples)
+            self.samples = []
+            # первое окно после смены уровня захватывает и прежний уровень,
+            # а судить об уровне можно, только если все его слоты заняты
+            if self.settling or self.active < self.limit:
+                self.settling = False
+                return
+            # точка отсчета — сглаженная задержка на уровне, где она измерена
+            if self.baseline is None:
+                self.baseline = median
+                self.baseline_level = self.limit
+            elif self.limit == self.baseline_level:
+                self.baseline += (median - self.baseline) * self.SMOOTHING
+            if median <= self.baseline * self.TOLERANCE:
+                self.strikes = 0
+                self.best = max(self.best, self.limit)
+                if self.limit < self.upper():
+                    self.set_limit(self.limit + 1, 'latency flat')
+                return
+            self.strikes += 1
+            if self.strikes >= self.STRIKES and self.limit > self.minimum:
+                # сервер начал отвечать медленнее: этот уровень уже лишний,
+                # точка отсчета заново измеряется на уровне ниже
+                self.strikes = 0
+                self.cap = self.limit - 1
+                self.best = min(self.best, self.cap)
+                self.baseline = None
+                self.set_limit(self.cap, 'latency grew')
+
+    def on_metrics(self, event, data):
+        """Обработчик ScanMetrics.hooks: задержки берутся из событий 'listing'."""
+        if event == 'listing':
+            self.observe(data['seconds'])
+
+    def back_off(self, reason='refused', sessions=None):
+        """sessions — сколько сессий было открыто вместе с отказавшей (по
+        умолчанию — занятые слоты)."""
+        with self.cond:
+            now = time.perf_counter()
+            if self.last_backoff is not None and now - self.last_backoff < self.COOLDOWN:
+                return
+            self.last_backoff = now
+            self.backoffs += 1
+            self.strikes = 0
+            self.baseline = None
+            allowed = max(self.minimum, (self.active if sessions is None else sessions) - 1)
+            if reason == 'timeout':
+                # таймаут говорит о перегрузке, а не о лимите сессий: в файл не попадает
+                self.cap = allowed if self.cap is None else min(self.cap, allowed)
+            else:
+                self.ceiling = allowed if self.ceiling is None else min(self.ceiling, allowed)
+                self.ceiling_at = time.time()
+            self.best = min(self.best, self.upper())
+            self.set_limit(max(self.minimum, min(self.limit // 2, self.upper())), reason)
+
+    def confirm(self, sessions):
+        """Вход удался при sessions открытых сессиях: потолок не ниже этого.
+        Отказ приходит, пока другие входы той же волны еще идут, и открытых в
+        этот момент может быть меньше, чем сервер на самом деле допускает."""
+        with self.cond:
+            if self.ceiling is not None and sessions > self.ceiling:
+                self.ceiling = sessions
+
+    def upper(self):
+        bounds = [value for value in (self.maximum, self.ceiling, self.cap) if value is not None]
+        return max(self.minimum, min(bounds))
+
+    def set_limit(self, limit, reason):
+        if limit != self.limit:
+            self.limit = limit
+            self.peak = max(self.peak, limit)
+            self.samples = []
+            self.settling = True
+            self.history.append((round(time.perf_counter() - self.started, 3), limit, reason))
+            self.cond.notify_all()
+
+    def summary(self):
+        with self.cond:
+            return {
+                'adaptive': self.adaptive,
+                'initial': self.initial,
+                'final': self.limit,
+                'best': self.best,
+                'peak': self.peak,
+                'ceiling': self.ceiling,
+                'backoffs': self.backoffs,
+                'history': [list(item) for item in self.history],
+            }
+
+
+def load_concurrency(file_path: str, host_key: str):
+    """Сохраненные для хоста {'best': .., 'ceiling': .., 'ceiling_at': ..} или None."""
+    try:
+        with open(file_path, encoding='utf-8') as f:
+            return json.load(f).get(host_key)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def saved_ceiling(saved, ttl=CEILING_TTL):
+    """(потолок, время отказа) из сохраненного уровня или (None, None), если
+    потолка нет или он старше ttl. Потолок без времени отказа записан прежней
+    версией и тоже не действует."""
+    ceiling = saved.get('ceiling')
+    try:
+        ceiling_at = time.mktime(time.strptime(saved['ceiling_at'], STAMP_FORMAT))
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return (None, None)
+    if ceiling is None or time.time() - ceiling_at > ttl:
+        return (None, None)
+    return (ceiling, ceiling_at)
+
+
+def save_concurrency(file_path: str, host_key: str, controller: ConcurrencyController):
+    with SAVE_LOCK:
+        write_concurrency(file_path, host_key, controller)
+
+
+def write_concurrency(file_path: str, host_key: str, controller: ConcurrencyController):
+    try:
+        with open(file_path, encoding='utf-8') as f:
+            hosts = json.load(f)
+        if not isinstance(hosts, dict):
+            hosts = {}
+    except (OSError, ValueError):
+        hosts = {}
+    hosts[host_key] = {
+        'best': controller.best,
+        'ceiling': controller.ceiling,
+        'ceiling_at': (time.strftime(STAMP_FORMAT, time.localtime(controller.ceiling_at))
+                       if controller.ceiling_at is not None else None),
+        'updated': time.strftime(STAMP_FORMAT),
+    }
+    try:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(hosts, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        print(f"Не удалось сохранить {file_path}: {e}")
@@ -0,0 +1,912 @@
+"""Движок проверки нормативов и оперативных проверок без зависимости от Qt.
+
+pandas импортируется лениво — только когда строятся таблицы и пишется отчет,
+поэтому запуск из планировщика начинает обход папок сразу.
+
+Если в process_* передан report (см. inspection.report.open_report), строки
+пишутся в него по завершении каждой ЭЧ, таблицы не строятся и вместо них
+возвращается (None, None).
+
+Замеры прогона (фазы, задержка по ЭЧ, команды FTP) собираются в
+ScanMetrics и после прогона доступны в Scanner.last_metrics.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from ftplib import FTP, Error, all_errors
+from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .async_ftp import AsyncFtpConnection, AsyncFtpPool
+from .concurrency import ConcurrencyController, load_concurrency, save_concurrency, saved_ceiling
+from .ftp import (FtpLister, FtpTreeLister, InstrumentedFTP, ftp_join, is_connection_lost, is_session_limit,
+                  parse_list_line)
+from .journal import ScanJournal
+from .listing import ListingCache
+from .metrics import ScanMetrics
+from .storage import is_network_path, local_workers
+from .report import CHECK_SHEET, RowCollector, open_report
+from .snapshot import ScanSnapshot
+from .summary import make_frames
+from .traversal import (AsyncPoolBackend, AsyncTreeWalker, FtpBackend, LocalBackend, PrefetchBackend, TreeWalker,
+                        gather_all)
+
+PATH_FILE = 'inspection_path.txt'
+MONTH_FILE = 'inspection_month.txt'
+CREDENTIALS_FILE = 'ftp_credentials.txt'
+METRICS_FILE = 'scan_metrics.json'
+SNAPSHOT_FILE = 'scan_snapshot.sqlite'
+
+
+class ScanCancelled(BaseException):
+    """Прогон остановлен через Scanner.cancel().
+
+    Как и asyncio.CancelledError, наследуется от BaseException, чтобы его не
+    перехватывали обработчики ошибок отдельных ЭЧ и папок.
+    """
+
+
+def ensure_config_files():
+    # Создаем файлы конфигурации, если отсутствуют
+    if not os.path.exists(PATH_FILE):
+        with open(PATH_FILE, 'w', encoding='utf-8') as p:
+            p.write('Укажите путь')
+    if not os.path.exists(MONTH_FILE):
+        with open(MONTH_FILE, 'w', encoding='utf-8') as m:
+            m.write('месяц год')
+    if not os.path.exists(CREDENTIALS_FILE):
+        with open(CREDENTIALS_FILE, 'w', encoding='utf-8') as f:
+            f.write('login\npassword')
+
+
+def read_file_with_encoding(file_path: str) -> str:
+    encodings = ['utf-8', 'cp1251', 'windows-1251']
+    for enc in encodings:
+        try:
+            with open(file_path, 'r', encoding=enc) as f:
+                content = f.read()
+                _ = content.encode('utf-8', errors='strict')
+                return content
+        except (UnicodeDecodeError, UnicodeEncodeError, FileNotFoundError):
+            continue
+    return ''
+
+
+def read_ftp_credentials():
+    ftp_login = ''
+    ftp_password = ''
+    try:
+        with open(CREDENTIALS_FILE, encoding='utf-8') as f:
+            creds = f.read().split('\n')
+            ftp_login = creds[0] if len(creds) > 0 else ''
+            ftp_password = creds[1] if len(creds) > 1 else ''
+    except Exception:
+        pass
+    return ftp_login, ftp_password
+
+
+def default_output_file(month: str) -> str:
+    return f"{os.getcwd()}{os.sep}Проверки {month}.xlsx"
+
+
+def scan_to_report(scan, output_file, *args, metrics=None, snapshot_file=None, summary=True, snapshot=None,
+                   **kwargs):
+    """Запускает scan (process_local/process_ftp) с потоковой записью отчета.
+
+    Отчет заменяет прежний файл только после успешного прогона (см.
+    inspection.report).
+
+    Если задан snapshot_file, прогон сохраняется и в снимок SQLite; snapshot —
+    уже открытый ScanSnapshot (общий для прогонов пакета), его закрывает
+    вызывающий. summary=False — без сводных листов (см. inspection.summary).
+    Возвращает число строк на листах "Оперативные" и "Нормативы".
+    """
+    metrics = metrics or ScanMetrics()
+    own_snapshot = ScanSnapshot(snapshot_file) if snapshot_file and snapshot is None else None
+    snapshot = snapshot or own_snapshot
+    report = open_report(output_file, summary)
+    try:
+        try:
+            scan(*args, report=report, metrics=metrics, snapshot=snapshot, **kwargs)
+        except BaseException:
+            # ошибка или отмена: прежний отчет остается, недописанные файлы удаляются
+            report.discard()
+            raise
+        with metrics.phase('report'):
+            report.close()
+    finally:
+        if own_snapshot is not None:
+            own_snapshot.close()
+    metrics.finish()
+    return (report.check_count, report.normativ_count)
+
+
+def snapshot_to_report(snapshot_file: str, month: str, output_file: str, root=None, summary=True):
+    """Строит отчет по снимку без обхода папок; возвращает число строк на листах."""
+    with ScanSnapshot(snapshot_file) as snapshot:
+        check_data, normativ_data = snapshot.rows(month, root)
+    with open_report(output_file, summary) as report:
+        report.write_rows(check_data, normativ_data)
+    return (report.check_count, report.normativ_count)
+
+
+def snapshot_root(path: str) -> str:
+    """Корень снимка для пути из настроек: как его записывает process_local/process_ftp."""
+    if path.lower().startswith('ftp://'):
+        host, port, ftp_path = Scanner().parse_ftp_url_with_cyrillic(path)
+        return f"ftp://{host}:{port}{ftp_path}"
+    return os.path.abspath(path)
+
+
+def snapshot_recorder(snapshot: ScanSnapshot, month, root, cache: ListingCache, folder_path):
+    """Запись прогона в снимок; folder_path(*имена) дает путь папки, как его видел обход."""
+    if snapshot is None:
+        return None
+
+    def file_count(sheet, row):
+        names = row[:4] if sheet == CHECK_SHEET else row[:3]
+        return cache.file_counts.get(folder_path(*names))
+    return snapshot.recorder(month, root, file_count)
+
+
+def collected_frames(collector: RowCollector, metrics: ScanMetrics):
+    if collector.snapshot is not None:
+        failed = metrics.extra.get('failed_ech')
+        if failed:
+            # неполный прогон не заменяет прежний снимок месяца
+            collector.snapshot.rollback()
+            print(f"Снимок не обновлен: обход неполный, ошибки в ЭЧ: {', '.join(failed)}")
+        else:
+            collector.snapshot.commit()
+    # при потоковой записи прогон завершает scan_to_report после закрытия отчета
+    if collector.report is not None:
+        return (None, None)
+    with metrics.phase('report'):
+        frames = make_frames(collector.check_data, collector.normativ_data)
+    metrics.finish()
+    return frames
+
+
+class Scanner:
+    VIDEO_EXTENSIONS = {'.mov', '.avi', '.mp4', '.mpeg', '.MP4', '.MOV', '.AVI', '.MPEG', '.mkv', '.MKV'}
+    # 'extension', 'size' или 'header' (см. inspection.video); по умолчанию
+    # видео считается по расширению, как раньше, проверки строже — по выбору
+    VIDEO_VALIDATION = 'extension'
+    VIDEO_MIN_SIZE = 64 * 1024
+    # сколько файлов папки проверки читать в поисках сигнатуры и сколько
+    # чтений заголовков локально (или в asyncio) идет одновременно
+    VIDEO_SNIFF_FILES = 3
+    VIDEO_SNIFF_WORKERS = 4
+    # начальное число соединений FTP, пока для сервера нет сохраненного уровня
+    FTP_MAX_CONNECTIONS = 4
+    # подбор числа соединений по задержке и отказам (см. inspection.concurrency)
+    FTP_ADAPTIVE = True
+    FTP_ADAPTIVE_MAX_CONNECTIONS = 16
+    CONCURRENCY_FILE = 'ftp_concurrency.json'
+    FTP_RECURSIVE_LISTING = False
+    # 'threads' — пул потоков с ftplib, 'async' — asyncio с конвейером листингов
+    FTP_ENGINE = 'threads'
+    FTP_MAX_IN_FLIGHT = 16
+    LISTING_CACHE_FILE = 'listing_cache.json'
+    # журнал прерванного прогона FTP (см. inspection.journal)
+    JOURNAL_FILE = 'scan_journal.jsonl'
+    # журнал старше этого (секунд с последней записи) не продолжается:
+    # папки за это время могли измениться
+    JOURNAL_MAX_AGE = 3600
+    FTP_RECONNECT_ATTEMPTS = 5
+    FTP_RECONNECT_DELAY = 1.0
+    # None — подбирается по типу хранилища (см. inspection.storage)
+    LOCAL_MAX_WORKERS = None
+
+    def __init__(self):
+        # замеры последнего прогона (см. inspection.metrics)
+        self.last_metrics = None
+        self.cancel_event = threading.Event()
+        self.sniff_slots = threading.BoundedSemaphore(self.VIDEO_SNIFF_WORKERS)
+
+    def cancel(self):
+        """Просит текущий прогон остановиться; рабочие потоки и задачи
+        проверяют флаг перед каждой папкой норматива и проверки."""
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise ScanCancelled("Проверка остановлена")
+
+    SKIPPED_CHECK_FOLDER = '01.08 ЭЧК-№'
+    # что считается материалами норматива: 'entries' — любая запись (файл
+    # или папка), 'files' — хотя бы один файл; None — как исторически в
+    # каждом режиме: локально любая запись, на FTP только файлы
+    # (Backend.materials)
+    MATERIALS_RULE = None
+
+    # ============ ПРАВИЛА ============
+    def is_check_folder(self, normativ_name):
+        return 'оперативные проверки' in normativ_name.lower()
+
+    def check_rows(self, ech_name, person_name, normativ_name, checks):
+        """Строки листа "Оперативные" для папки оперативных проверок.
+
+        checks — список пар (имя проверки, есть ли видео) в порядке листинга.
+        """
+        rows = [[ech_name, person_name, normativ_name, check_name, 1 if has_video else 0]
+                for check_name, has_video in checks]
+        check_count = len(rows)
+        while check_count < 3:
+            rows.append([ech_name, person_name, normativ_name, '!!!Нет проверки', 0])
+            check_count += 1
+        if check_count < 4 and 'ЭЧ ' not in person_name and 'ЭЧ-% ' not in person_name:
+            rows.append([ech_name, person_name, normativ_name, 'Нет проверки', 0])
+        return rows
+
+    def has_materials(self, entries, rule='files'):
+        """В папке норматива есть материалы. rule — правило хранилища,
+        MATERIALS_RULE его заменяет."""
+        if (self.MATERIALS_RULE or rule) == 'entries':
+            return bool(entries)
+        return any(not entry.is_dir for entry in entries)
+
+    def normativ_row(self, ech_name, person_name, normativ_name, entries, rule='files'):
+        """Строка листа "Нормативы" по листингу папки норматива."""
+        return [ech_name, person_name, normativ_name, 1 if self.has_materials(entries, rule) else 0]
+
+    def is_video_file(self, filename):
+        return os.path.splitext(filename)[1] in self.VIDEO_EXTENSIONS
+
+    def video_candidates(self, entries):
+        """Файлы видео из листинга, прошедшие проверку размера (неизвестный
+        размер проверку проходит)."""
+        files = [e for e in entries if not e.is_dir and self.is_video_file(e.name)]
+        if self.VIDEO_VALIDATION == 'extension':
+            return files
+        return [e for e in files if e.size is None or e.size >= self.VIDEO_MIN_SIZE]
+
+    def fresh_video_listing(self):
+        """Листинг папки проверки нужен свежий: отметка папки не меняется,
+        когда файл дописывается, и размеры из кэша могут быть устаревшими."""
+        return self.VIDEO_VALIDATION != 'extension'
+
+    def video_signature(self, entries):
+        """Имя, размер и отметка файлов-кандидатов: сохраненный вывод о
+        сигнатурах действует, только пока они не изменились."""
+        return [[e.name, e.size, e.modify] for e in self.video_candidates(entries)]
+
+    def video_verdict(self, folder_path, entries, cache=None, stamp=None):
+        """(есть ли видео, имена файлов для чтения заголовка).
+
+        Вывод None значит, что в режиме 'header' нужно прочитать заголовки
+        файлов из списка: видео есть, если хотя бы у одного из них сигнатура
+        контейнера.
+        """
+        candidates = self.video_candidates(entries)
+        if self.VIDEO_VALIDATION != 'header' or not candidates:
+            return (bool(candidates), [])
+        verdict = cache.verdict(folder_path, stamp, self.video_signature(entries)) if cache else None
+        if verdict is not None:
+            return (verdict, [])
+        return (None, [e.name for e in candidates[:self.VIDEO_SNIFF_FILES]])
+
+    # ============ ЛОКАЛЬНЫЙ РЕЖИМ ============
+    def process_local(self, path, month, progress_callback=None, force_rescan=False, report=None, metrics=None,
+                      max_workers=None, snapshot=None, listing_store=None):
+        metrics = metrics or ScanMetrics()
+        self.last_metrics = metrics
+        self.cancel_event.clear()
+        workers = max_workers or self.LOCAL_MAX_WORKERS or local_workers(path)
+        metrics.extra.update(source='local', root=os.path.abspath(path), month=month, workers=workers)
+        cache = ListingCache(self.LISTING_CACHE_FILE, os.path.abspath(path), month, force=force_rescan,
+                             store=listing_store)
+        recorder = snapshot_recorder(snapshot, month, os.path.abspath(path), cache,
+                                     lambda *names: os.path.join(path, *names))
+        collector = RowCollector(report, metrics, recorder)
+
+        if progress_callback:
+            progress_callback(5)
+
+        ech_list = [entry for entry in self.scan_local(path, metrics) if entry.is_dir()]
+
+        total_ech = max(1, len(ech_list))
+
+        # Единица работы — папка норматива: крупная ЭЧ больше не держит весь
+        # прогон, пока остальные потоки простаивают. Строки ЭЧ собираются по
+        # порядку единиц и уходят в отчет в порядке обхода ЭЧ.
+        backend = LocalBackend(self, metrics, stamps=True)
+        if is_network_path(path):
+            # листинги на уровень вперед окупаются, только когда каждый ждет сервера
+            backend = PrefetchBackend(backend, workers)
+        walker = TreeWalker(self, backend, cache, metrics)
+        with backend, ThreadPoolExecutor(max_workers=workers) as executor:
+            started = {}
+            plan_futures = {}
+            for idx, ech in enumerate(ech_list):
+                started[idx] = time.perf_counter()
+                plan_futures[executor.submit(walker.plan, ech.path)] = idx
+
+            units = []
+            failed = []
+            for planned, future in enumerate(as_completed(plan_futures)):
+                idx = plan_futures[future]
+                try:
+                    units.extend((idx,) + unit for unit in future.result())
+                except Exception as e:
+                    print(f"Ошибка обработки {ech_list[idx].name}: {e}")
+                    failed.append(ech_list[idx].name)
+                if progress_callback:
+                    progress_callback(5 + int(5 * (planned + 1) / total_ech))
+
+            results = {idx: [] for idx in range(len(ech_list))}
+            remaining = dict.fromkeys(results, 0)
+            futures = {}
+            for idx, person_name, normativ, normativ_path in sorted(units, key=lambda unit: unit[0]):
+                unit = len(results[idx])
+                results[idx].append(([], []))
+                remaining[idx] += 1
+                future = executor.submit(walker.normativ_rows, ech_list[idx].name, person_name, normativ,
+                                         normativ_path)
+                futures[future] = (idx, unit)
+
+            def ech_done(idx):
+                ech_check_data = [row for check_rows, _ in results[idx] for row in check_rows]
+                ech_normativ_data = [row for _, normativ_rows in results[idx] for row in normativ_rows]
+                metrics.ech_done(ech_list[idx].name, time.perf_counter() - started[idx])
+                collector.add(idx, ech_check_data, ech_normativ_data)
+
+            for idx in results:
+                if not remaining[idx]:
+                    ech_done(idx)
+
+            total_units = max(1, len(futures))
+            for done, future in enumerate(as_completed(futures)):
+                idx, unit = futures[future]
+                try:
+                    results[idx][unit] = future.result()
+                except Exception as e:
+                    print(f"Ошибка обработки {ech_list[idx].name}: {e}")
+                    failed.append(ech_list[idx].name)
+                remaining[idx] -= 1
+                if not remaining[idx]:
+                    ech_done(idx)
+                if progress_callback:
+                    progress_callback(10 + int(85 * (done + 1) / total_units))
+
+        cache.save()
+        # ЭЧ, в которых папки пропущены из-за ошибок, — по первой части пути
+        failed.extend(os.path.relpath(folder, path).split(os.sep)[0] for folder in walker.errors)
+        metrics.extra.update(cache_hits=cache.hits, failed_ech=list(dict.fromkeys(failed)))
+
+        df_check, df_normativ = collected_frames(collector, metrics)
+
+        if progress_callback:
+            progress_callback(100)
+        return (df_check, df_normativ)
+
+    def process_normativ_local(self, ech_name, person_name, normativ, cache=None, metrics=None):
+        """Строки одной папки норматива (os.DirEntry) — для наблюдения за папкой."""
+        backend = LocalBackend(self, metrics, stamps=cache is not None)
+        walker = TreeWalker(self, backend, cache, metrics)
+        return walker.normativ_rows(ech_name, person_name, backend.entry(normativ), normativ.path)
+
+    def scan_local(self, folder_path, metrics=None):
+        started = time.perf_counter()
+        with os.scandir(folder_path) as entries:
+            entries = list(entries)
+        if metrics is not None:
+            metrics.listing(folder_path, time.perf_counter() - started)
+        return entries
+
+    def local_video_stat(self, entry):
+        """(размер, st_mtime_ns) файла видео; stat нужен только им — размер
+        и отметка проверяются в режимах 'size' и 'header'."""
+        if entry.is_dir() or not self.is_video_file(entry.name):
+            return (0, None)
+        if self.VIDEO_VALIDATION == 'extension':
+            # на сетевом диске stat — запрос к серверу, а расширения хватает
+            return (None, None)
+        try:
+            stat = entry.stat()
+        except OSError:
+            return (None, None)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    # ============ FTP РЕЖИМ ============
+    def parse_ftp_url_with_cyrillic(self, ftp_url: str):
+        ftp_url = ftp_url.strip()
+        if not ftp_url.startswith('ftp://'):
+            raise ValueError("URL должен начинаться с ftp://")
+        rest = ftp_url[6:]
+        if '/' in rest:
+            host_port, path = rest.split('/', 1)
+            path = '/' + path
+        else:
+            host_port = rest
+            path = '/'
+        if ':' in host_port:
+            host, port_str = host_port.rsplit(':', 1)
+            try:
+                port = int(port_str)
+            except ValueError:
+                port = 21
+        else:
+            host = host_port
+            port = 21
+        try:
+            decoded_path = unquote(path, encoding='cp1251', errors='strict')
+        except Exception:
+            decoded_path = path
+        parts = [p for p in decoded_path.split('/') if p]
+        normalized_path = '/' + '/'.join(parts) if parts else '/'
+        return host, port, normalized_path
+
+    def connect_ftp(self, host, port, ftp_login, ftp_password, metrics=None):
+        metrics = metrics or ScanMetrics()
+        with metrics.phase('connect'):
+            ftp = InstrumentedFTP(metrics, encoding='cp1251')  # критично для Serv-U и кириллицы
+            ftp.connect(host, port, timeout=30)
+            ftp.login(ftp_login, ftp_password)
+        return ftp
+
+    def navigate_ftp_path(self, ftp: FTP, ftp_path: str):
+        # Пошаговая навигация по пути
+        if ftp_path != '/':
+            parts = [p for p in ftp_path.split('/') if p]
+            for part in parts:
+                try:
+                    ftp.cwd(part)
+                except all_errors:
+                    # fallback: ищем через LIST
+                    items = []
+                    ftp.retrlines('LIST', items.append)
+                    found = False
+                    for item in items:
+                        entry = parse_list_line(item)
+                        if entry and entry.is_dir:
+                            if entry.name.lower() == part.lower() or entry.name == part:
+                                ftp.cwd(entry.name)
+                                found = True
+                                break
+                    if not found:
+                        raise ValueError(f"Не удалось найти папку: {part}")
+        return ftp.pwd()
+
+    def process_ftp(self, ftp_url, month, ftp_login, ftp_password, progress_callback=None, max_connections=None,
+                    recursive=None, force_rescan=False, engine=None, report=None, metrics=None, snapshot=None,
+                    session=None, listing_store=None):
+        """session (inspection.batch.FtpSession) — соединения и уровень
+        параллельности, общие для прогонов пакета по одному серверу;
+        listing_store (inspection.listing.ListingStore) — общий кэш листингов."""
+        if (engine or self.FTP_ENGINE) == 'async':
+            return self.process_ftp_async(ftp_url, month, ftp_login, ftp_password, progress_callback,
+                                          max_connections=max_connections, force_rescan=force_rescan,
+                                          report=report, metrics=metrics, snapshot=snapshot, session=session,
+                                          listing_store=listing_store)
+        metrics = metrics or ScanMetrics()
+        self.last_metrics = metrics
+        self.cancel_event.clear()
+        try:
+            host, port, ftp_path = self.parse_ftp_url_with_cyrillic(ftp_url)
+            if not host:
+                raise ValueError("Некорректный FTP URL!")
+            metrics.extra.update(source='ftp', engine='threads', root=ftp_url, month=month)
+            controller = self.concurrency_controller(host, port, ftp_login, max_connections, session)
+
+            # соединения, оставшиеся от прошлого прогона пакета
+            reused = session.drain(metrics) if session is not None else []
+            if reused:
+                lister = reused.pop(0)
+                with metrics.phase('navigate'):
+                    lister.ftp.cwd(session.home)
+                    base_path = self.navigate_ftp_path(lister.ftp, ftp_path)
+            else:
+                ftp = self.connect_ftp(host, port, ftp_login, ftp_password, metrics)
+                with metrics.phase('navigate'):
+                    if session is not None:
+                        session.home = ftp.pwd()
+                    base_path = self.navigate_ftp_path(ftp, ftp_path)
+                    # FEAT проверяется один раз, остальные соединения наследуют результат
+                    lister = FtpLister(ftp, metrics=metrics)
+
+            if progress_callback:
+                progress_callback(5)
+
+            cache = ListingCache(self.LISTING_CACHE_FILE, f"ftp://{host}:{port}{base_path}", month, force=force_rescan,
+                                 store=listing_store)
+            journal = self.open_journal(f"ftp://{host}:{port}{base_path}", month, force_rescan)
+            ech_list = self.get_ftp_folders(lister, base_path)
+            total_ech = max(1, len(ech_list))
+
+            # Пул авторизованных соединений: каждый поток берет свободное
+            # соединение, а новое открывает только если пул пуст
+            pool = queue.Queue()
+            pool.put(lister)
+            for conn in reused:
+                pool.put(conn)
+            # Рекурсивный листинг отключается после первого отказа сервера
+            recursive_state = {
+                'enabled': self.FTP_RECURSIVE_LISTING if recursive is None else recursive
+            }
+
+            # открытые сессии сервера (свободные и занятые): по ним при отказе
+            # по лимиту определяется потолок
+            sessions = {'open': 1 + len(reused)}
+            sessions_lock = threading.Lock()
+
+            def count_session(delta):
+                with sessions_lock:
+                    sessions['open'] += delta
+                    if delta > 0:
+                        controller.confirm(sessions['open'])
+
+            def reconnect(attempt):
+                time.sleep(self.reconnect_delay(attempt))
+                ftp = self.connect_ftp(host, port, ftp_login, ftp_password, metrics)
+                count_session(1)
+                with metrics.phase('navigate'):
+                    ftp.cwd(base_path)
+                return FtpLister(ftp, lister.use_mlsd, metrics)
+
+            def connect():
+                ftp = self.connect_ftp(host, port, ftp_login, ftp_password, metrics)
+                count_session(1)
+                return FtpLister(ftp, lister.use_mlsd, metrics)
+
+            def close_connection(conn, lost=False):
+                count_session(-1)
+                if lost:
+                    conn.ftp.close()
+                    return
+                try:
+                    conn.ftp.quit()
+                except all_errors:
+                    conn.ftp.close()
+
+            def keep_connection(conn):
+                # после снижения предела лишние соединения закрываются, чтобы
+                # открытых сессий (занятых и свободных) было не больше предела
+                if pool.qsize() + controller.active > controller.limit:
+                    close_connection(conn)
+                else:
+                    pool.put(conn)
+
+            def idle_connection():
+                try:
+                    return pool.get_nowait()
+                except queue.Empty:
+                    return None
+
+            def trim_pool():
+                # свободные соединения сверх сниженного предела держат сессии
+                # сервера, и новый вход снова получил бы отказ по лимиту
+                while pool.qsize() + controller.active > controller.limit:
+                    conn = idle_connection()
+                    if conn is None:
+                        break
+                    close_connection(conn)
+
+            failed = []
+            # ЭЧ, на которых кончились попытки переподключения: прогон прерван
+            lost = []
+
+            def crawl_ech(ech_name):
+                started = time.perf_counter()
+                self.check_cancelled()
+                rows = journal.ech(ech_name)
+                if rows is not None:
+                    return rows
+                with controller.slot():
+                    return crawl_ech_rows(ech_name, started)
+
+            def crawl_ech_rows(ech_name, started):
+                self.check_cancelled()
+                conn = None
+                check_data = []
+                normativ_data = []
+                for attempt in range(self.FTP_RECONNECT_ATTEMPTS + 1):
+                    check_data = []
+                    normativ_data = []
+                    try:
+                        if conn is None:
+                            # сначала свободное соединение пула, новый вход — только если его нет
+                            conn = idle_connection()
+                        if conn is None:
+                            conn = reconnect(attempt) if attempt else connect()
+                        ech_lister = conn
+                        ech_path = ftp_join(base_path, ech_name)
+                        if recursive_state['enabled']:
+                            tree = conn.list_tree(ech_path)
+                            if tree is None:
+                                recursive_state['enabled'] = False
+                            else:
+                                ech_lister = FtpTreeLister(tree, conn)
+                        # Все листинги идут по абсолютному пути, без cwd туда и обратно;
+                        # папки, записанные в журнал до обрыва, заново не обходятся
+                        with PrefetchBackend(FtpBackend(ech_lister)) as backend:
+                            walker = TreeWalker(self, backend, cache, metrics, journal)
+                            check_data, normativ_data = walker.ech_rows(ech_name, ech_path)
+                        if walker.errors:
+                            # ЭЧ с пропущенными папками в журнал не записывается:
+                            # следующий запуск обойдет их заново
+                            failed.append(ech_name)
+                        else:
+                            journal.record_ech(ech_name, check_data, normativ_data)
+                        break
+                    except ScanCancelled:
+                        if conn is not None:
+                            pool.put(conn)
+                        raise
+                    except Exception as e:
+                        if not is_connection_lost(e) and not is_session_limit(e):
+                            print(f"Ошибка обработки {ech_name}: {e}")
+                            failed.append(ech_name)
+                            break
+                        # соединение потеряно: в пул его не возвращаем, переподключаемся
+                        # и продолжаем с первой незаписанной в журнал папки
+                        print(f"Соединение потеряно при обработке {ech_name}: {e}")
+                        if conn is not None:
+                            close_connection(conn, lost=True)
+                            conn = None
+                        if is_session_limit(e) or isinstance(e, TimeoutError):
+                            # сервер перегружен или исчерпан лимит сессий: предел
+                            # снижается, и слот ждем заново уже при новом пределе
+                            controller.back_off('session limit' if is_session_limit(e) else 'timeout',
+                                                sessions=sessions['open'] + 1)
+                            trim_pool()
+                            controller.release()
+                            controller.acquire()
+                else:
+                    print(f"Ошибка обработки {ech_name}: не удалось восстановить соединение")
+                    failed.append(ech_name)
+                    lost.append(ech_name)
+                if conn is not None:
+                    keep_connection(conn)
+                metrics.ech_done(ech_name, time.perf_counter() - started)
+                return (check_data, normativ_data)
+
+            recorder = snapshot_recorder(snapshot, month, f"ftp://{host}:{port}{base_path}", cache,
+                                         lambda *names: ftp_join(base_path, *names))
+            collector = RowCollector(report, metrics, recorder)
+            # потоков — по верхней границе, сверх предела они ждут слота
+            workers = max(1, min(controller.upper(), len(ech_list)))
+            metrics.hooks.append(controller.on_metrics)
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = {
+                        executor.submit(crawl_ech, ech_name): idx
+                        for idx, ech_name in enumerate(ech_list)
+                    }
+                    for done, future in enumerate(as_completed(futures)):
+                        try:
+                            ech_check_data, ech_normativ_data = future.result()
+                        except Exception as e:
+                            print(f"Ошибка обработки {ech_list[futures[future]]}: {e}")
+                            failed.append(ech_list[futures[future]])
+                            ech_check_data, ech_normativ_data = [], []
+                        # Порядок строк совпадает с последовательным обходом ЭЧ
+                        collector.add(futures[future], ech_check_data, ech_normativ_data)
+                        if progress_callback:
+                            progress_callback(5 + int(90 * (done + 1) / total_ech))
+            except ScanCancelled:
+                # журнал остается: следующий запуск продолжит с места остановки
+                journal.close(completed=False)
+                raise
+            finally:
+                metrics.hooks.remove(controller.on_metrics)
+                self.finish_concurrency(controller, host, port, ftp_login, metrics)
+                while not pool.empty():
+                    conn = pool.get_nowait()
+                    if session is not None:
+                        # соединения остаются открытыми для следующего прогона пакета
+                        session.keep(conn)
+                        continue
+                    close_connection(conn)
+
+            cache.save()
+            # журнал остается, только если прогон прерван обрывом связи: ошибки
+            # отдельных папок (нет прав, 550) повторятся и при продолжении, а
+            # записанные строки иначе заменяли бы свежие листинги во всех
+            # следующих прогонах
+            journal.close(completed=not lost)
+            metrics.extra.update(cache_hits=cache.hits, resumed=journal.resumed, failed_ech=failed)
+
+            df_check, df_normativ = collected_frames(collector, metrics)
+
+            if progress_callback:
+                progress_callback(100)
+            return (df_check, df_normativ)
+
+        except Exception as e:
+            raise Exception(f"Ошибка FTP: {str(e)}")
+
+    def concurrency_controller(self, host, port, ftp_login, max_connections=None, session=None):
+        """Явно заданное число соединений не подбирается, а только снижается при
+        отказах сервера; иначе прогон начинается с лучшего уровня прошлого раза.
+        В пакете контроллер один на сессию сервера и переходит от прогона к прогону."""
+        if session is not None:
+            if session.controller is None:
+                session.controller = self.concurrency_controller(host, port, ftp_login, max_connections)
+            return session.controller
+        if max_connections or not self.FTP_ADAPTIVE:
+            limit = max_connections or self.FTP_MAX_CONNECTIONS
+            return ConcurrencyController(limit, limit, adaptive=False)
+        saved = load_concurrency(self.CONCURRENCY_FILE, f"{ftp_login}@{host}:{port}") or {}
+        ceiling, ceiling_at = saved_ceiling(saved)
+        return ConcurrencyController(saved.get('best') or self.FTP_MAX_CONNECTIONS, self.FTP_ADAPTIVE_MAX_CONNECTIONS,
+                                     ceiling=ceiling, ceiling_at=ceiling_at)
+
+    def finish_concurrency(self, controller: ConcurrencyController, host, port, ftp_login, metrics):
+        summary = controller.summary()
+        metrics.extra.update(connections=summary['best'], concurrency=summary)
+        if controller.adaptive:
+            save_concurrency(self.CONCURRENCY_FILE, f"{ftp_login}@{host}:{port}", controller)
+
+    def open_journal(self, root, month, force_rescan=False):
+        journal = ScanJournal(self.JOURNAL_FILE, root, month, force=force_rescan, max_age=self.JOURNAL_MAX_AGE)
+        if journal.resuming:
+            print(f"Продолжение прерванной проверки по журналу {self.JOURNAL_FILE}: "
+                  f"ЭЧ — {len(journal.echs)}, папок — {len(journal.normativs)}")
+        return journal
+
+    def reconnect_delay(self, attempt):
+        return min(30.0, self.FTP_RECONNECT_DELAY * 2 ** (attempt - 1))
+
+    def get_ftp_folders(self, lister: FtpLister, path: str):
+        return lister.folders(path)
+
+    # ============ FTP РЕЖИМ (asyncio) ============
+    def process_ftp_async(self, ftp_url, month, ftp_login, ftp_password, progress_callback=None,
+                          max_connections=None, force_rescan=False, max_in_flight=None, report=None, metrics=None,
+                          snapshot=None, session=None, listing_store=None):
+        metrics = metrics or ScanMetrics()
+        self.last_metrics = metrics
+        self.cancel_event.clear()
+        try:
+            crawl = self.crawl_ftp_async(
+                ftp_url, month, ftp_login, ftp_password, progress_callback,
+                max_connections, force_rescan, max_in_flight or self.FTP_MAX_IN_FLIGHT,
+                report, metrics, snapshot, session, listing_store
+            )
+            # пул сессии пакета живет в ее цикле событий между прогонами
+            return session.run(crawl) if session is not None else asyncio.run(crawl)
+        except Exception as e:
+            raise Exception(f"Ошибка FTP: {str(e)}")
+
+    async def navigate_ftp_path_async(self, conn: AsyncFtpConnection, ftp_path: str, home=None):
+        # Пошаговая навигация по пути (от начальной папки home, если соединение уже ходило)
+        if home is not None:
+            await conn.command(f'CWD {home}')
+        if ftp_path != '/':
+            parts = [p for p in ftp_path.split('/') if p]
+            for part in parts:
+                try:
+                    await conn.command(f'CWD {part}')
+                except Error:
+                    # fallback: ищем через LIST
+                    found = False
+                    for item in await conn.retrlines('LIST'):
+                        entry = parse_list_line(item)
+                        if entry and entry.is_dir:
+                            if entry.name.lower() == part.lower() or entry.name == part:
+                                await conn.command(f'CWD {entry.name}')
+                                found = True
+                                break
+                    if not found:
+                        raise ValueError(f"Не удалось найти папку: {part}")
+        return await conn.pwd()
+
+    async def crawl_ftp_async(self, ftp_url, month, ftp_login, ftp_password, progress_callback,
+                              max_connections, force_rescan, max_in_flight, report=None, metrics=None,
+                              snapshot=None, session=None, listing_store=None):
+        metrics = metrics or ScanMetrics()
+        host, port, ftp_path = self.parse_ftp_url_with_cyrillic(ftp_url)
+        if not host:
+            raise ValueError("Некорректный FTP URL!")
+        metrics.extra.update(source='ftp', engine='async', root=ftp_url, month=month, in_flight=max_in_flight)
+        controller = self.concurrency_controller(host, port, ftp_login, max_connections, session)
+
+        pool = session.async_pool if session is not None else None
+        if pool is None:
+            conn = AsyncFtpConnection(host, port, metrics=metrics)
+            with metrics.phase('connect'):
+                await conn.connect(ftp_login, ftp_password)
+            pool = AsyncFtpPool(host, port, ftp_login, ftp_password, controller.limit,
+                                asyncio.Semaphore(max_in_flight), metrics=metrics, controller=controller,
+                                header_reads=self.VIDEO_SNIFF_WORKERS)
+            pool.adopt(conn)
+            home = None
+        else:
+            # пул прошлого прогона пакета: навигация от начальной папки
+            await pool.refresh(metrics)
+            home = session.home
+
+        if progress_callback:
+            progress_callback(5)
+
+        metrics.hooks.append(controller.on_metrics)
+        try:
+            with metrics.phase('navigate'):
+                if home is None:
+                    if session is not None:
+                        session.async_pool = pool
+                        session.home = await conn.pwd()
+                    base_path = await self.navigate_ftp_path_async(conn, ftp_path)
+                    # FEAT проверяется один раз на первом соединении
+                    pool.use_mlsd = await conn.supports_mlsd()
+                else:
+                    base_path = await pool.call(lambda conn: self.navigate_ftp_path_async(conn, ftp_path, home))
+            cache = ListingCache(self.LISTING_CACHE_FILE, f"ftp://{host}:{port}{base_path}", month, force=force_rescan,
+                                 store=listing_store)
+            journal = self.open_journal(f"ftp://{host}:{port}{base_path}", month, force_rescan)
+
+            ech_list = [e.name for e in await pool.list_dir(base_path) if e.is_dir]
+            total_ech = max(1, len(ech_list))
+            done = 0
+            failed = []
+            lost = []
+            recorder = snapshot_recorder(snapshot, month, f"ftp://{host}:{port}{base_path}", cache,
+                                         lambda *names: ftp_join(base_path, *names))
+            collector = RowCollector(report, metrics, recorder)
+
+            async def crawl_ech_rows(ech_name):
+                rows = journal.ech(ech_name)
+                if rows is not None:
+                    return rows
+                check_data = []
+                normativ_data = []
+                for attempt in range(self.FTP_RECONNECT_ATTEMPTS + 1):
+                    if attempt:
+                        # потерянные соединения пул уже закрыл, новые откроются при
+                        # следующем листинге; записанные в журнал папки пропускаются
+                        await asyncio.sleep(self.reconnect_delay(attempt))
+                    check_data = []
+                    normativ_data = []
+                    try:
+                        walker = AsyncTreeWalker(self, AsyncPoolBackend(pool), cache, metrics, journal)
+                        check_data, normativ_data = await walker.ech_rows(ech_name, ftp_join(base_path, ech_name))
+                        if walker.errors:
+                            failed.append(ech_name)
+                        else:
+                            journal.record_ech(ech_name, check_data, normativ_data)
+                        return (check_data, normativ_data)
+                    except Exception as e:
+                        if not is_connection_lost(e) and not is_session_limit(e):
+                            print(f"Ошибка обработки {ech_name}: {e}")
+                            failed.append(ech_name)
+                            return (check_data, normativ_data)
+                        print(f"Соединение потеряно при обработке {ech_name}: {e}")
+                print(f"Ошибка обработки {ech_name}: не удалось восстановить соединение")
+                failed.append(ech_name)
+                lost.append(ech_name)
+                return (check_data, normativ_data)
+
+            async def crawl_ech(idx, ech_name):
+                nonlocal done
+                started = time.perf_counter()
+                check_data, normativ_data = await crawl_ech_rows(ech_name)
+                metrics.ech_done(ech_name, time.perf_counter() - started)
+                # строки уходят дальше в порядке ЭЧ, как при последовательном обходе
+                collector.add(idx, check_data, normativ_data)
+                done += 1
+                if progress_callback:
+                    progress_callback(5 + int(90 * done / total_ech))
+
+            try:
+                await gather_all(crawl_ech(idx, ech_name) for idx, ech_name in enumerate(ech_list))
+            except ScanCancelled:
+                journal.close(completed=False)
+                raise
+        finally:
+            metrics.hooks.remove(controller.on_metrics)
+            self.finish_concurrency(controller, host, port, ftp_login, metrics)
+            if session is None:
+                await pool.close()
+
+        cache.save()
+        journal.close(completed=not lost)
+        metrics.extra.update(cache_hits=cache.hits, resumed=journal.resumed, failed_ech=failed)
+
+        df_check, df_normativ = collected_frames(collector, metrics)
+
+        if progress_callback:
+            progress_callback(100)
+        return (df_check, df_normativ)
@@ -0,0 +1,302 @@
+import re
+import time
+from datetime import datetime, timedelta
+from ftplib import FTP, error_perm, error_temp, all_errors
+
+from .listing import ListingEntry
+
+# drwxr-xr-x   1 user     group        4096 May 12 10:30 Имя папки
+UNIX_LIST_RE = re.compile(
+    r'^(?P<type>[\-dlcbps])\S{9}\S*\s+\d+\s+\S+\s+\S+\s+(?P<size>\d+)\s+'
+    r'(?P<date>\w{3}\s+\d{1,2}\s+(?:\d{1,2}:\d{2}|\d{4}))\s(?P<name>.+)$'
+)
+# 05-12-24  10:30AM       <DIR>          Имя папки
+DOS_LIST_RE = re.compile(
+    r'^(?P<date>\d{2}-\d{2}-\d{2,4}\s+\d{1,2}:\d{2}(?:[AP]M)?)\s+(?P<size><DIR>|\d+)\s+(?P<name>.+)$',
+    re.IGNORECASE
+)
+
+MONTHS = {name: number for number, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+# дата из LIST — время сервера в его часовом поясе, поэтому "недавняя"
+# отметка определяется с запасом на любую разницу поясов
+LIST_STAMP_WINDOW = timedelta(days=1)
+
+
+def parse_list_line(line: str):
+    # Вместо факта modify из MLSD сохраняем дату из LIST (точность до минуты)
+    match = UNIX_LIST_RE.match(line)
+    if match:
+        name = match.group('name')
+        if match.group('type') == 'l' and ' -> ' in name:
+            name = name.split(' -> ', 1)[0]
+        is_dir = match.group('type') == 'd'
+        modify = ' '.join(match.group('date').split())
+        return ListingEntry(name, is_dir, int(match.group('size')), settled_stamp(modify) if is_dir else modify)
+    match = DOS_LIST_RE.match(line)
+    if match:
+        is_dir = match.group('size').upper() == '<DIR>'
+        modify = ' '.join(match.group('date').split())
+        return ListingEntry(match.group('name'), is_dir, 0 if is_dir else int(match.group('size')),
+                            settled_stamp(modify) if is_dir else modify)
+    return None
+
+
+def settled_stamp(stamp: str, now=None):
+    """Дата из LIST как отметка папки для кэша листингов или None.
+
+    Дата точна до минуты: файл, добавленный в ту же минуту, что и листинг,
+    отметку папки не меняет, и закэшированный листинг остался бы старым
+    навсегда. Поэтому папки с датой в пределах LIST_STAMP_WINDOW от текущего
+    времени (и с датой, которую не удалось разобрать) не кэшируются.
+    """
+    now = now or datetime.now()
+    moment = list_date(stamp, now)
+    if moment is None or abs(now - moment) <= LIST_STAMP_WINDOW:
+        return None
+    return stamp
+
+
+def list_date(stamp: str, now: datetime):
+    """datetime по дате из LIST: "May 12 10:30", "May 12 2023" или
+    "05-12-24 10:30AM"; None, если формат незнаком."""
+    parts = stamp.split()
+    try:
+        if len(parts) == 3 and parts[0].lower() in MONTHS:
+            month, day = MONTHS[parts[0].lower()], int(parts[1])
+            if ':' not in parts[2]:
+                return datetime(int(parts[2]), month, day)
+            hour, minute = (int(value) for value in parts[2].split(':'))
+            # без года — дата за последние полгода: год текущий или прошлый
+            moment = datetime(now.year, month, day, hour, minute)
+            return moment if moment <= now + LIST_STAMP_WINDOW else moment.replace(year=now.year - 1)
+        if len(parts) == 2:
+            month, day, year = (int(value) for value in parts[0].split('-'))
+            clock = parts[1].upper()
+            hour, minute = (int(value) for value in clock.rstrip('AMP').split(':'))
+            if clock.endswith(('AM', 'PM')):
+                hour = hour % 12 + (12 if clock.endswith('PM') else 0)
+            return datetime(year + 2000 if year < 70 else year + 1900 if year < 100 else year,
+                            month, day, hour, minute)
+    except ValueError:
+        return None
+    return None
+
+
+def ftp_join(path, *names):
+    for name in names:
+        path = f"{path}/{name}".replace('//', '/')
+    return path
+
+
+def is_connection_lost(error) -> bool:
+    """Ошибка означает потерю управляющего соединения, а не отказ по одной папке."""
+    if isinstance(error, (OSError, EOFError)):
+        return True
+    return isinstance(error, error_temp) and str(error).startswith('421')
+
+
+# пояснения к 530, которыми Serv-U и другие серверы отказывают сверх лимита сессий
+SESSION_LIMIT_WORDS = ('session', 'connection', 'too many', 'maximum', 'limit', 'сеанс', 'соединен', 'лимит')
+
+
+def is_session_limit(error) -> bool:
+    """Сервер отказал из-за лимита сессий: 421 или 530 с пояснением о лимите."""
+    text = str(error)
+    if isinstance(error, error_temp) and text.startswith('421'):
+        return True
+    return isinstance(error, error_perm) and text.startswith('530') and any(
+        word in text.lower() for word in SESSION_LIMIT_WORDS
+    )
+
+
+def parse_mlsd_line(line: str):
+    facts_found, _, name = line.rstrip('\r\n').partition(' ')
+    facts = {}
+    for fact in facts_found[:-1].split(';'):
+        key, _, value = fact.partition('=')
+        facts[key.lower()] = value
+    kind = facts.get('type', '').lower()
+    if not name or kind in ('cdir', 'pdir') or name in ('.', '..'):
+        return None
+    # без факта size размер неизвестен (None), а не нулевой
+    size = facts.get('size')
+    return ListingEntry(name, kind == 'dir', int(size) if size and size.isdigit() else None, facts.get('modify'))
+
+
+class InstrumentedFTP(FTP):
+    """ftplib.FTP, который считает каждую отправленную команду в ScanMetrics."""
+
+    def __init__(self, metrics=None, **kwargs):
+        self.metrics = metrics
+        super().__init__(**kwargs)
+
+    def putcmd(self, line):
+        if self.metrics is not None:
+            self.metrics.command(line)
+        super().putcmd(line)
+
+
+class FtpLister:
+    """Листинг каталога FTP по абсолютному пути одной командой (MLSD или LIST <path>)."""
+
+    def __init__(self, ftp: FTP, use_mlsd=None, metrics=None):
+        self.ftp = ftp
+        self.metrics = metrics
+        self.use_mlsd = self.supports_mlsd() if use_mlsd is None else use_mlsd
+        if self.use_mlsd:
+            try:
+                self.ftp.sendcmd('OPTS MLST type;size;modify;')
+            except all_errors:
+                pass
+
+    def bind(self, metrics):
+        """Переводит замеры соединения на другой прогон (соединения пакета
+        переходят от задания к заданию)."""
+        self.metrics = metrics
+        self.ftp.metrics = metrics
+
+    def supports_mlsd(self):
+        try:
+            resp = self.ftp.sendcmd('FEAT')
+        except all_errors:
+            return False
+        return any(line.strip().upper().startswith('MLST') for line in resp.splitlines()[1:])
+
+    def retrlines(self, cmd: str, path: str, callback):
+        started = time.perf_counter()
+        nbytes = 0
+
+        def counted(line):
+            nonlocal nbytes
+            nbytes += len(line) + 2
+            callback(line)
+
+        try:
+            return self.ftp.retrlines(f'{cmd} {path}', counted if self.metrics is not None else callback)
+        finally:
+            if self.metrics is not None:
+                self.metrics.listing(path, time.perf_counter() - started, nbytes)
+
+    def list_dir(self, path: str):
+        if self.use_mlsd:
+            lines = []
+            self.retrlines('MLSD', path, lines.append)
+            return [entry for entry in map(parse_mlsd_line, lines) if entry]
+
+        lines = []
+        self.retrlines('LIST', path, lines.append)
+        entries = []
+        for line in lines:
+            entry = parse_list_line(line)
+            if entry and entry.name not in ('.', '..'):
+                entries.append(entry)
+        return entries
+
+    def list_tree(self, path: str):
+        """Рекурсивный листинг поддерева одной командой (LIST -R, затем STAT -R).
+
+        Возвращает словарь {абсолютный путь: [ListingEntry]} или None, если сервер
+        не умеет рекурсивный листинг.
+        """
+        for command in ('LIST -R', 'STAT -R'):
+            listing = RecursiveListing(path)
+            try:
+                if command.startswith('LIST'):
+                    self.retrlines(command, path, listing.feed)
+                else:
+                    started = time.perf_counter()
+                    resp = self.ftp.sendcmd(f'{command} {path}')
+                    if self.metrics is not None:
+                        self.metrics.listing(path, time.perf_counter() - started, len(resp))
+                    for line in resp.splitlines()[1:-1]:
+                        listing.feed(line.lstrip(' '))
+            except error_perm:
+                continue
+            if listing.is_recursive():
+                return listing.tree
+        return None
+
+    def read_header(self, path: str, nbytes: int) -> bytes:
+        """Первые nbytes файла: RETR, после которых канал данных закрывается,
+        не дожидаясь конца файла."""
+        self.ftp.voidcmd('TYPE I')
+        chunks = []
+        received = 0
+        with self.ftp.transfercmd(f'RETR {path}') as conn:
+            while received < nbytes:
+                chunk = conn.recv(nbytes - received)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                received += len(chunk)
+        try:
+            self.ftp.voidresp()
+        except error_temp:
+            pass  # 426/451: сервер сообщает об оборванной передаче
+        return b''.join(chunks)
+
+    def folders(self, path: str):
+        return [e.name for e in self.list_dir(path) if e.is_dir]
+
+    def files(self, path: str):
+        return [e.name for e in self.list_dir(path) if not e.is_dir]
+
+
+class FtpTreeLister(FtpLister):
+    """Листинг из дерева, полученного рекурсивной командой, без обращений к серверу.
+
+    Каталоги, которых нет в дереве, запрашиваются у обычного листера.
+    """
+
+    def __init__(self, tree, fallback: FtpLister):
+        self.ftp = fallback.ftp
+        self.metrics = fallback.metrics
+        self.use_mlsd = fallback.use_mlsd
+        self.tree = tree
+        self.fallback = fallback
+
+    def list_dir(self, path: str):
+        entries = self.tree.get(path.rstrip('/') or '/')
+        if entries is None:
+            return self.fallback.list_dir(path)
+        return entries
+
+
+class RecursiveListing:
+    """Потоковый разбор вывода LIST -R / STAT -R в словарь {путь: [ListingEntry]}.
+
+    Блоки каталогов начинаются строкой-заголовком вида "/путь:" или "./путь:".
+    Строки до первого заголовка относятся к корню листинга.
+    """
+
+    def __init__(self, root: str):
+        self.root = root.rstrip('/') or '/'
+        self.tree = {self.root: []}
+        self.current = self.root
+
+    def feed(self, line: str):
+        if not line.strip() or line.startswith('total '):
+            return
+        entry = parse_list_line(line)
+        if entry:
+            if entry.name not in ('.', '..'):
+                self.tree.setdefault(self.current, []).append(entry)
+            return
+        if line.endswith(':'):
+            self.current = self.resolve(line[:-1])
+            self.tree.setdefault(self.current, [])
+
+    def resolve(self, header: str):
+        if header.startswith('/'):
+            return header.rstrip('/') or '/'
+        if header in ('.', './'):
+            return self.root
+        if header.startswith('./'):
+            header = header[2:]
+        return f"{self.root}/{header}".replace('//', '/').rstrip('/')
+
+    def is_recursive(self):
+        # Сервер, проигнорировавший -R, вернет только один уровень
+        has_subdirs = any(e.is_dir for e in self.tree[self.root])
+        return len(self.tree) > 1 or not has_subdirs
@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+
+
+class ScanJournal:
+    """Журнал прогона FTP для продолжения после обрыва или остановки.
+
+    Файл пополняется по одной JSON-записи в строке: первая строка — область
+    (корень и месяц), дальше строки завершенных папок нормативов и целых ЭЧ.
+    При следующем запуске с той же областью записанные папки не обходятся
+    заново. Файл удаляется, когда обход дошел до конца, и остается только
+    после остановки или обрыва связи. Журнал, в который не писали дольше
+    max_age секунд, не продолжается: прогон начинается заново.
+    """
+
+    def __init__(self, file_path: str, root: str, month: str, force=False, max_age=None):
+        self.file_path = file_path
+        self.scope = f"{root}|{month}"
+        self.lock = threading.Lock()
+        self.normativs = {}
+        self.echs = {}
+        self.resumed = 0
+        records = None if force or self.expired(file_path, max_age) else self.load(file_path, self.scope)
+        if records is None:
+            self.file = open(file_path, 'w', encoding='utf-8')
+            self.write({'scope': self.scope})
+        else:
+            for record in records:
+                rows = (record.get('check', []), record.get('normativ', []))
+                if 'ech' in record:
+                    self.echs[record['ech']] = rows
+                elif 'dir' in record:
+                    self.normativs[record['dir']] = rows
+            self.file = open(file_path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def expired(file_path: str, max_age):
+        if max_age is None:
+            return False
+        try:
+            return time.time() - os.path.getmtime(file_path) > max_age
+        except OSError:
+            return False
+
+    @staticmethod
+    def load(file_path: str, scope: str):
+        try:
+            with open(file_path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return None
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break  # последняя строка могла не дописаться при остановке
+        if not records or records[0].get('scope') != scope:
+            return None
+        return records[1:]
+
+    @property
+    def resuming(self):
+        return bool(self.echs or self.normativs)
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def ech(self, ech_name: str):
+        rows = self.echs.get(ech_name)
+        if rows is not None:
+            with self.lock:
+                self.resumed += 1
+        return rows
+
+    def normativ(self, path: str):
+        rows = self.normativs.get(path)
+        if rows is not None:
+            with self.lock:
+                self.resumed += 1
+        return rows
+
+    def record_normativ(self, path: str, check_rows, normativ_rows):
+        with self.lock:
+            self.normativs[path] = (check_rows, normativ_rows)
+            self.write({'dir': path, 'check': check_rows, 'normativ': normativ_rows})
+
+    def record_ech(self, ech_name: str, check_rows, normativ_rows):
+        with self.lock:
+            self.echs[ech_name] = (check_rows, normativ_rows)
+            self.write({'ech': ech_name, 'check': check_rows, 'normativ': normativ_rows})
+
+    def close(self, completed: bool):
+        self.file.close()
+        if completed:
+            try:
+                os.remove(self.file_path)
+            except OSError:
+                pass
@@ -0,0 +1,172 @@
+import json
+import threading
+from collections import namedtuple
+
+ListingEntry = namedtuple('ListingEntry', ['name', 'is_dir', 'size', 'modify'])
+
+
+class ListingCache:
+    """Кэш листингов конечных папок (проверки, нормативы) между запусками.
+
+    Листинг берется из кэша, если отметка папки не изменилась: st_mtime_ns для
+    локальной папки, факт modify из MLSD (или дата из LIST) для FTP. Дата из
+    LIST точна до минуты, поэтому недавно измененные папки с ней не кэшируются
+    (см. inspection.ftp.settled_stamp). Кэш разбит на области по корню и
+    месяцу; папки, не встреченные при сканировании, удаляются из области при
+    сохранении. Рядом с листингом папки проверки
+    хранится вывод о сигнатурах ее видео (см. inspection.video).
+
+    С store (ListingStore) файл общий для прогонов пакета: листинг берется и
+    из записей других прогонов по тому же корню (при полном пересканировании —
+    только из полученных в этом же запуске пакета, см. ListingStore).
+    """
+
+    # кэш другого формата при загрузке отбрасывается
+    FORMAT = 2
+
+    def __init__(self, file_path: str, root: str, month: str, force=False, store=None):
+        self.file_path = file_path
+        self.scope = f"{root}|{month}"
+        self.force = force
+        self.listing_store = store
+        self.lock = threading.Lock()
+        self.data = store.data if store is not None else self.load(file_path)
+        self.previous = self.data.get(self.scope, {})
+        self.shared = store.records(root) if store is not None else {}
+        self.current = {}
+        self.file_counts = {}
+        self.hits = 0
+
+    @classmethod
+    def load(cls, file_path: str):
+        try:
+            with open(file_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('format') != cls.FORMAT:
+            return {}
+        return data
+
+    def listing(self, path: str, stamp, list_func):
+        entries = self.lookup(path, stamp)
+        if entries is None:
+            entries = list_func(path)
+        self.store(path, stamp, entries)
+        return entries
+
+    def lookup(self, path: str, stamp):
+        cached = self.cached(path, stamp)
+        if cached is None:
+            return None
+        self.hits += 1
+        return [ListingEntry(*item) for item in cached[1]]
+
+    def cached(self, path: str, stamp):
+        """Запись папки с той же отметкой: из прошлого прогона области или из
+        другого прогона пакета по тому же корню."""
+        if stamp is None:
+            return None
+        for records in ((self.shared,) if self.force else (self.previous, self.shared)):
+            cached = records.get(path)
+            if cached is not None and cached[0] == stamp:
+                return cached
+        return None
+
+    def store(self, path: str, stamp, entries):
+        with self.lock:
+            # число файлов нужно снимку прогона и без отметки папки
+            self.file_counts[path] = sum(1 for e in entries if not e.is_dir)
+            if stamp is not None:
+                record = [stamp, [list(e) for e in entries]]
+                # вывод о видео переходит в новую запись вместе с подписью
+                # файлов, по которой он проверяется (см. verdict)
+                cached = self.cached(path, stamp)
+                if cached is not None and len(cached) >= 4:
+                    record += cached[2:4]
+                self.current[path] = self.shared[path] = record
+
+    def verdict(self, path: str, stamp, signature):
+        """Сохраненный вывод о видео папки, если не изменились ни ее отметка,
+        ни подпись файлов-кандидатов (имя, размер, отметка): файл, который
+        дописывается, не меняет отметки папки."""
+        cached = self.cached(path, stamp)
+        if cached is None or len(cached) < 4 or cached[3] != signature:
+            return None
+        return cached[2]
+
+    def store_verdict(self, path: str, value: bool, signature):
+        with self.lock:
+            record = self.current.get(path)
+            if record is not None:
+                self.current[path] = self.shared[path] = record[:2] + [value, signature]
+
+    def save(self):
+        if self.listing_store is not None:
+            self.listing_store.save(self.scope, self.current)
+            return
+        self.data['format'] = self.FORMAT
+        self.data[self.scope] = self.current
+        try:
+            with open(self.file_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"Не удалось сохранить кэш листингов: {e}")
+
+    @classmethod
+    def evict(cls, file_path: str, root=None, month=None):
+        """Удаляет области кэша для корня и/или месяца (без аргументов — весь
+        кэш) и возвращает их число; файл перезаписывается, только если есть
+        что удалить."""
+        data = cls.load(file_path)
+        removed = 0
+        for scope in list(data):
+            if scope == 'format':
+                continue
+            scope_root, _, scope_month = scope.rpartition('|')
+            if (root is None or scope_root == root) and (month is None or scope_month == month):
+                del data[scope]
+                removed += 1
+        if removed:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        return removed
+
+
+class ListingStore:
+    """Файл кэша листингов, общий для прогонов одного пакета (см. inspection.batch).
+
+    Файл читается один раз, области прогонов дописываются в него под
+    блокировкой. records(root) — записи всех областей корня (прошлых месяцев
+    и уже прошедших прогонов пакета): отметка папки та же — листинг тот же.
+    При force (полное пересканирование) записи из файла не берутся: records
+    заполняют только прогоны этого пакета.
+    """
+
+    def __init__(self, file_path: str, force=False):
+        self.file_path = file_path
+        self.force = force
+        self.lock = threading.Lock()
+        self.data = ListingCache.load(file_path)
+        self.roots = {}
+
+    def records(self, root: str):
+        with self.lock:
+            if root not in self.roots:
+                merged = {}
+                if not self.force:
+                    for scope, paths in self.data.items():
+                        if scope != 'format' and scope.rpartition('|')[0] == root:
+                            merged.update(paths)
+                self.roots[root] = merged
+            return self.roots[root]
+
+    def save(self, scope: str, current):
+        with self.lock:
+            self.data['format'] = ListingCache.FORMAT
+            self.data[scope] = current
+            try:
+                with open(self.file_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.data, f, ensure_ascii=False)
+            except OSError as e:
+                print(f"Не удалось сохранить кэш листингов: {e}")
@@ -0,0 +1,111 @@
+"""Замеры прогона проверки: фазы, задержка по ЭЧ, команды FTP, медленные папки.
+
+Время фаз суммируется по всем рабочим потокам и задачам, поэтому при
+параллельном обходе сумма фаз может быть больше общего времени прогона.
+"""
+import heapq
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PHASES = ('connect', 'navigate', 'listing', 'rules', 'report')
+
+
+class ScanMetrics:
+    """Сборщик замеров одного прогона.
+
+    hooks — функции hook(event, data), вызываются сразу по событию:
+    'ech' (ЭЧ обработана), 'listing' (получен листинг папки), 'rows' (строки
+    очередной ЭЧ в порядке обхода, {'check': [...], 'normativ': [...]}),
+    'finish' (итог).
+    """
+
+    def __init__(self, hooks=None, slowest=10):
+        self.hooks = list(hooks or [])
+        self.slowest_count = slowest
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.finished = None
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.ech_seconds = {}
+        self.commands = Counter()
+        self.listing_bytes = 0
+        self.listings = 0
+        self.slowest = []
+        self.extra = {}
+
+    def emit(self, event, data):
+        for hook in self.hooks:
+            try:
+                hook(event, data)
+            except Exception as e:
+                print(f"Ошибка в обработчике метрик: {e}")
+
+    def add_phase(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - started)
+
+    def command(self, line: str):
+        cmd = line.split(' ', 1)[0].upper()
+        with self.lock:
+            self.commands[cmd] += 1
+
+    def listing(self, path: str, seconds: float, nbytes=0):
+        with self.lock:
+            self.phases['listing'] += seconds
+            self.listings += 1
+            self.listing_bytes += nbytes
+            item = (seconds, path)
+            if len(self.slowest) < self.slowest_count:
+                heapq.heappush(self.slowest, item)
+            elif item > self.slowest[0]:
+                heapq.heapreplace(self.slowest, item)
+        if self.hooks:
+            self.emit('listing', {'path': path, 'seconds': seconds, 'bytes': nbytes})
+
+    def ech_done(self, ech_name: str, seconds: float):
+        with self.lock:
+            self.ech_seconds[ech_name] = seconds
+        if self.hooks:
+            self.emit('ech', {'ech': ech_name, 'seconds': seconds})
+
+    def finish(self):
+        self.finished = time.time()
+        if self.hooks:
+            self.emit('finish', self.summary())
+
+    @property
+    def wall_seconds(self):
+        return (self.finished or time.time()) - self.started
+
+    def summary(self):
+        with self.lock:
+            return {
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'wall_seconds': round(self.wall_seconds, 3),
+                'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+                'ech_seconds': {name: round(seconds, 3) for name, seconds in self.ech_seconds.items()},
+                'listings': self.listings,
+                'listing_bytes': self.listing_bytes,
+                'ftp_commands': dict(self.commands),
+                'ftp_commands_total': sum(self.commands.values()),
+                'slowest_dirs': [
+                    {'path': path, 'seconds': round(seconds, 3)}
+                    for seconds, path in sorted(self.slowest, reverse=True)
+                ],
+                **self.extra,
+            }
+
+    def save(self, file_path: str):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
@@ -0,0 +1,359 @@
+"""Запись отчета: целиком из таблиц pandas или потоково по мере обхода ЭЧ.
+
+Потоковые писатели держат в памяти не больше одной пачки строк, поэтому
+пиковое потребление памяти не зависит от размера сети. Формат выбирается
+по расширению файла: .xlsx (openpyxl write-only), .csv, .parquet (pyarrow).
+
+Сводные листы (см. inspection.summary) пишутся при закрытии отчета из
+счетчиков по группам, которые писатель копит вместо строк.
+
+Файлы пишутся рядом с итоговыми под именем "<файл>.part" и заменяют прежний
+отчет только при успешном close(); discard() (ошибка или отмена прогона)
+удаляет их, и прошлый полный отчет остается на месте.
+"""
+import csv
+import os
+
+CHECK_COLUMNS = ["ЭЧ", "Руководитель", "Норматив", "Где проводились", "Наличие видео ОП"]
+NORMATIV_COLUMNS = ["ЭЧ", "Руководитель", "Норматив", "Наличие материалов"]
+
+CHECK_SHEET = 'Оперативные'
+NORMATIV_SHEET = 'Нормативы'
+
+
+def save_report(df_check, df_normativ, output_file: str, summary=True):
+    import pandas as pd
+    from .summary import summary_frames
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        df_check.to_excel(writer, sheet_name=CHECK_SHEET, index=False)
+        df_normativ.to_excel(writer, sheet_name=NORMATIV_SHEET, index=False)
+        if summary:
+            for sheet, frame in summary_frames(df_check, df_normativ).items():
+                frame.to_excel(writer, sheet_name=sheet, index=False)
+
+
+def sheet_file(output_file: str, sheet: str) -> str:
+    """Для форматов без листов каждый лист пишется в свой файл: "<имя> <лист>.csv"."""
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem} {sheet}{ext}"
+
+
+class ReportWriter:
+    """Базовый потоковый писатель: write_rows() вызывается по завершении каждой ЭЧ.
+
+    Подклассы пишут строки листов, сводные таблицы (write_summary) и
+    завершают файлы в finish().
+    """
+
+    def __init__(self, output_file: str, summary=True):
+        self.output_file = output_file
+        self.check_count = 0
+        self.normativ_count = 0
+        if summary:
+            from .summary import SummaryCounter
+            self.summary = SummaryCounter()
+        else:
+            self.summary = None
+        self.closed = False
+        # итоговый файл -> временный, в который идет запись
+        self.parts = {}
+
+    def part(self, path: str) -> str:
+        self.parts[path] = f"{path}.part"
+        return self.parts[path]
+
+    def write_rows(self, check_rows, normativ_rows):
+        self.write_check_rows(check_rows)
+        self.write_normativ_rows(normativ_rows)
+        self.check_count += len(check_rows)
+        self.normativ_count += len(normativ_rows)
+        if self.summary is not None:
+            self.summary.add(check_rows, normativ_rows)
+
+    def write_check_rows(self, rows):
+        raise NotImplementedError
+
+    def write_normativ_rows(self, rows):
+        raise NotImplementedError
+
+    def write_summary(self, sheet: str, frame):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            try:
+                if self.summary is not None:
+                    for sheet, frame in self.summary.frames().items():
+                        self.write_summary(sheet, frame)
+                    self.summary = None
+            finally:
+                self.finish()
+        except BaseException:
+            self.discard()
+            raise
+        self.closed = True
+        for path, part in self.parts.items():
+            os.replace(part, path)
+
+    def discard(self):
+        """Закрывает файлы и удаляет их, не трогая прежний отчет."""
+        if self.closed:
+            return
+        self.closed = True
+        self.summary = None
+        try:
+            self.finish()
+        except Exception:
+            pass
+        for part in self.parts.values():
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+
+
+class XlsxReportWriter(ReportWriter):
+    """xlsx в режиме write-only: openpyxl сбрасывает строки листа во временный файл."""
+
+    def __init__(self, output_file: str, summary=True):
+        super().__init__(output_file, summary)
+        from openpyxl import Workbook
+
+        self.workbook = Workbook(write_only=True)
+        self.check_sheet = self.create_sheet(CHECK_SHEET, CHECK_COLUMNS)
+        self.normativ_sheet = self.create_sheet(NORMATIV_SHEET, NORMATIV_COLUMNS)
+
+    def create_sheet(self, title, columns):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment, Border, Font, Side
+
+        sheet = self.workbook.create_sheet(title)
+        # Заголовок оформлен так же, как его пишет pandas.to_excel
+        thin = Side(style='thin')
+        header = []
+        for column in columns:
+            cell = WriteOnlyCell(sheet, value=column)
+            cell.font = Font(bold=True)
+            cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+            cell.alignment = Alignment(horizontal='center', vertical='top')
+            header.append(cell)
+        sheet.append(header)
+        return sheet
+
+    def write_check_rows(self, rows):
+        for row in rows:
+            self.check_sheet.append(row)
+
+    def write_normativ_rows(self, rows):
+        for row in rows:
+            self.normativ_sheet.append(row)
+
+    def write_summary(self, sheet, frame):
+        summary_sheet = self.create_sheet(sheet, list(frame.columns))
+        # пустые доли (NaN) пишутся пустыми ячейками
+        for row in frame.astype(object).where(frame.notna(), None).itertuples(index=False):
+            summary_sheet.append(list(row))
+
+    def finish(self):
+        if self.workbook is not None:
+            workbook, self.workbook = self.workbook, None
+            workbook.save(self.part(self.output_file))
+
+    def discard(self):
+        # книга еще не сохранялась: сохранять ее ради удаления незачем, а
+        # листы закрываются и их временные файлы openpyxl удаляются
+        workbook, self.workbook = self.workbook, None
+        if workbook is not None:
+            for sheet in workbook.worksheets:
+                try:
+                    sheet.close()
+                    sheet._writer.cleanup()
+                except Exception:
+                    pass
+        super().discard()
+
+
+class CsvReportWriter(ReportWriter):
+    """Два CSV-файла в UTF-8 с BOM (открываются в Excel без перекодировки)."""
+
+    def __init__(self, output_file: str, summary=True):
+        super().__init__(output_file, summary)
+        self.check_file = open(self.part(sheet_file(output_file, CHECK_SHEET)), 'w', encoding='utf-8-sig',
+                               newline='')
+        self.normativ_file = open(self.part(sheet_file(output_file, NORMATIV_SHEET)), 'w', encoding='utf-8-sig',
+                                  newline='')
+        self.check_writer = csv.writer(self.check_file)
+        self.normativ_writer = csv.writer(self.normativ_file)
+        self.check_writer.writerow(CHECK_COLUMNS)
+        self.normativ_writer.writerow(NORMATIV_COLUMNS)
+
+    def write_check_rows(self, rows):
+        self.check_writer.writerows(rows)
+
+    def write_normativ_rows(self, rows):
+        self.normativ_writer.writerows(rows)
+
+    def write_summary(self, sheet, frame):
+        frame.to_csv(self.part(sheet_file(self.output_file, sheet)), index=False, encoding='utf-8-sig')
+
+    def finish(self):
+        self.check_file.close()
+        self.normativ_file.close()
+
+
+class ParquetReportWriter(ReportWriter):
+    """Два Parquet-файла; строки копятся пачками по BATCH_ROWS и пишутся группами строк."""
+
+    BATCH_ROWS = 10000
+
+    def __init__(self, output_file: str, summary=True):
+        super().__init__(output_file, summary)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Для отчета в формате Parquet установите пакет pyarrow")
+        self.pa = pa
+        self.check_schema = self.schema(CHECK_COLUMNS)
+        self.normativ_schema = self.schema(NORMATIV_COLUMNS)
+        self.check_writer = pq.ParquetWriter(self.part(sheet_file(output_file, CHECK_SHEET)), self.check_schema)
+        self.normativ_writer = pq.ParquetWriter(self.part(sheet_file(output_file, NORMATIV_SHEET)),
+                                                self.normativ_schema)
+        self.check_batch = []
+        self.normativ_batch = []
+
+    def schema(self, columns):
+        # последняя колонка — флаг 0/1, остальные — строки
+        fields = [(name, self.pa.string()) for name in columns[:-1]] + [(columns[-1], self.pa.int8())]
+        return self.pa.schema(fields)
+
+    def flush(self, writer, schema, batch):
+        if batch:
+            columns = list(zip(*batch))
+            writer.write_table(self.pa.Table.from_arrays(
+                [self.pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            batch.clear()
+
+    def write_check_rows(self, rows):
+        self.check_batch.extend(rows)
+        if len(self.check_batch) >= self.BATCH_ROWS:
+            self.flush(self.check_writer, self.check_schema, self.check_batch)
+
+    def write_normativ_rows(self, rows):
+        self.normativ_batch.extend(rows)
+        if len(self.normativ_batch) >= self.BATCH_ROWS:
+            self.flush(self.normativ_writer, self.normativ_schema, self.normativ_batch)
+
+    def write_summary(self, sheet, frame):
+        frame.to_parquet(self.part(sheet_file(self.output_file, sheet)), index=False)
+
+    def finish(self):
+        self.flush(self.check_writer, self.check_schema, self.check_batch)
+        self.flush(self.normativ_writer, self.normativ_schema, self.normativ_batch)
+        self.check_writer.close()
+        self.normativ_writer.close()
+
+
+REPORT_WRITERS = {
+    '.xlsx': XlsxReportWriter,
+    '.csv': CsvReportWriter,
+    '.parquet': ParquetReportWriter,
+}
+
+
+def open_report(output_file, summary=True) -> ReportWriter:
+    """summary=False — без сводных листов (и без накопления строк для них).
+
+    Список файлов — один обход пишется сразу в несколько отчетов.
+    """
+    if isinstance(output_file, (list, tuple)):
+        return ReportTee([open_report(file, summary) for file in output_file])
+    ext = os.path.splitext(output_file)[1].lower()
+    if ext not in REPORT_WRITERS:
+        raise ValueError(f"Неизвестный формат отчета: {ext or output_file} (поддерживаются .xlsx, .csv, .parquet)")
+    return REPORT_WRITERS[ext](output_file, summary)
+
+
+class ReportTee(ReportWriter):
+    """Одни и те же строки в несколько отчетов, например .xlsx и .parquet."""
+
+    def __init__(self, reports):
+        super().__init__(reports[0].output_file, summary=False)
+        self.reports = reports
+
+    def write_rows(self, check_rows, normativ_rows):
+        for report in self.reports:
+            report.write_rows(check_rows, normativ_rows)
+        self.check_count += len(check_rows)
+        self.normativ_count += len(normativ_rows)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        error = None
+        for report in self.reports:
+            try:
+                report.close()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def discard(self):
+        self.closed = True
+        for report in self.reports:
+            report.discard()
+
+
+class RowCollector:
+    """Принимает строки ЭЧ в порядке завершения и отдает их в порядке обхода.
+
+    С писателем строки сразу уходят на диск (ждать приходится только
+    отстающие ЭЧ), без писателя копятся в памяти для построения таблиц.
+    snapshot (inspection.snapshot.SnapshotRecorder) получает те же строки.
+    """
+
+    def __init__(self, report: ReportWriter = None, metrics=None, snapshot=None):
+        self.report = report
+        self.metrics = metrics
+        self.snapshot = snapshot
+        self.pending = {}
+        self.next_index = 0
+        self.check_data = []
+        self.normativ_data = []
+
+    def add(self, index, check_rows, normativ_rows):
+        self.pending[index] = (check_rows, normativ_rows)
+        while self.next_index in self.pending:
+            check_rows, normativ_rows = self.pending.pop(self.next_index)
+            self.next_index += 1
+            if self.snapshot is not None:
+                self.snapshot.write_rows(check_rows, normativ_rows)
+            if self.report is not None:
+                if self.metrics is not None:
+                    with self.metrics.phase('report'):
+                        self.report.write_rows(check_rows, normativ_rows)
+                else:
+                    self.report.write_rows(check_rows, normativ_rows)
+            else:
+                self.check_data.extend(check_rows)
+                self.normativ_data.extend(normativ_rows)
+            if self.metrics is not None and self.metrics.hooks:
+                self.metrics.emit('rows', {'check': check_rows, 'normativ': normativ_rows})
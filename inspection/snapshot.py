@@ -0,0 +1,222 @@
+"""Снимки прогонов в SQLite: строка на каждую папку проверки и норматива.
+
+Снимок ключуется месяцем и корнем обхода; повторный прогон того же месяца
+заменяет прежний снимок целиком, только если дошел до конца. По снимку без
+нового обхода строятся выборки ("у кого нет видео в ЭЧ-5"), сравнение с
+прошлым месяцем и сам отчет.
+"""
+import re
+import sqlite3
+import threading
+import time
+
+from .report import CHECK_SHEET, NORMATIV_SHEET
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    month TEXT NOT NULL,
+    root TEXT NOT NULL,
+    started TEXT NOT NULL,
+    finished TEXT,
+    UNIQUE (month, root)
+);
+CREATE TABLE IF NOT EXISTS folders (
+    scan_id INTEGER NOT NULL REFERENCES scans (id) ON DELETE CASCADE,
+    sheet TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    ech TEXT NOT NULL,
+    person TEXT NOT NULL,
+    normativ TEXT NOT NULL,
+    check_name TEXT,
+    flag INTEGER NOT NULL,
+    file_count INTEGER,
+    PRIMARY KEY (scan_id, sheet, seq)
+);
+CREATE INDEX IF NOT EXISTS folders_person ON folders (scan_id, ech, person);
+CREATE INDEX IF NOT EXISTS folders_flag ON folders (scan_id, sheet, flag);
+'''
+
+# Первые буквы названий месяцев: "май 2024", "Мая 2024", "сент. 2024"
+MONTH_PREFIXES = ['янв', 'фев', 'мар', 'апр', 'ма', 'июн', 'июл', 'авг', 'сен', 'окт', 'ноя', 'дек']
+MONTH_RE = re.compile(r'^\s*([а-яё]+)\.?\s+(\d{4})\s*$', re.IGNORECASE)
+
+
+def month_key(month: str):
+    """(год, номер месяца) для "май 2024"; None, если строку разобрать не удалось."""
+    match = MONTH_RE.match(month or '')
+    if not match:
+        return None
+    name = match.group(1).lower()
+    for number, prefix in enumerate(MONTH_PREFIXES, 1):
+        if name.startswith(prefix):
+            return (int(match.group(2)), number)
+    return None
+
+
+class ScanSnapshot:
+    """Файл снимков; соединение общее для потоков, запись под блокировкой.
+
+    deferred=True — строки прогона копятся в памяти и пишутся одной
+    транзакцией при commit(): так в один файл пишут параллельные прогоны
+    пакета, не держа друг друга и не задевая чужую транзакцию.
+    """
+
+    def __init__(self, file_path: str, deferred=False):
+        self.file_path = file_path
+        self.deferred = deferred
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(file_path, check_same_thread=False)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def recorder(self, month: str, root: str, file_count=None):
+        return SnapshotRecorder(self, month, root, file_count)
+
+    def scans(self):
+        cur = self.db.execute('SELECT month, root, finished FROM scans WHERE finished IS NOT NULL ORDER BY finished')
+        return cur.fetchall()
+
+    def scan_id(self, month: str, root=None):
+        """Последний завершенный снимок месяца (по корню, если он указан)."""
+        sql = 'SELECT id FROM scans WHERE month = ? AND finished IS NOT NULL'
+        params = [month]
+        if root is not None:
+            sql += ' AND root = ?'
+            params.append(root)
+        row = self.db.execute(sql + ' ORDER BY finished DESC LIMIT 1', params).fetchone()
+        if row is None:
+            raise ValueError(f"Нет снимка за {month}" + (f" для {root}" if root else ''))
+        return row[0]
+
+    def previous_month(self, month: str, root=None):
+        """Ближайший более ранний месяц со снимком (по названию месяца, иначе по времени прогона)."""
+        current = self.db.execute(
+            'SELECT root, finished FROM scans WHERE id = ?', (self.scan_id(month, root),)
+        ).fetchone()
+        candidates = [(m, finished) for m, r, finished in self.scans() if m != month and r == current[0]]
+        key = month_key(month)
+        if key is not None:
+            earlier = [(month_key(m), m) for m, _ in candidates if month_key(m) and month_key(m) < key]
+            if earlier:
+                return max(earlier)[1]
+        earlier = [(finished, m) for m, finished in candidates if finished < current[1]]
+        return max(earlier)[1] if earlier else None
+
+    def rows(self, month: str, root=None):
+        """Строки листов отчета в исходном порядке: (check_data, normativ_data)."""
+        scan_id = self.scan_id(month, root)
+        check_data = [list(row) for row in self.db.execute(
+            'SELECT ech, person, normativ, check_name, flag FROM folders '
+            'WHERE scan_id = ? AND sheet = ? ORDER BY seq', (scan_id, CHECK_SHEET)
+        )]
+        normativ_data = [list(row) for row in self.db.execute(
+            'SELECT ech, person, normativ, flag FROM folders '
+            'WHERE scan_id = ? AND sheet = ? ORDER BY seq', (scan_id, NORMATIV_SHEET)
+        )]
+        return (check_data, normativ_data)
+
+    def missing_video(self, month: str, ech=None, root=None):
+        """Оперативные проверки без видео (включая недостающие): [(ЭЧ, руководитель, норматив, проверка)]."""
+        sql = ('SELECT ech, person, normativ, check_name FROM folders '
+               'WHERE scan_id = ? AND sheet = ? AND flag = 0')
+        params = [self.scan_id(month, root), CHECK_SHEET]
+        if ech is not None:
+            sql += ' AND ech = ?'
+            params.append(ech)
+        return self.db.execute(sql + ' ORDER BY seq', params).fetchall()
+
+    def diff(self, month: str, previous: str, root=None):
+        """Изменения по папкам нормативов между двумя месяцами.
+
+        Для оперативных сравнивается число проверок с видео, для нормативов —
+        наличие материалов. Возвращает [(лист, ЭЧ, руководитель, норматив,
+        было, стало)]; None — папки в том месяце не было.
+        """
+        totals = ('SELECT sheet, ech, person, normativ, SUM(flag) AS value FROM folders '
+                  'WHERE scan_id = ? GROUP BY sheet, ech, person, normativ')
+        before = {row[:4]: row[4] for row in self.db.execute(totals, (self.scan_id(previous, root),))}
+        after = {row[:4]: row[4] for row in self.db.execute(totals, (self.scan_id(month, root),))}
+        changes = []
+        for key in sorted(before.keys() | after.keys()):
+            if before.get(key) != after.get(key):
+                changes.append(key + (before.get(key), after.get(key)))
+        return changes
+
+
+class SnapshotRecorder:
+    """Принимает строки ЭЧ так же, как писатель отчета (write_rows).
+
+    Старый снимок месяца удаляется в той же транзакции, что пишется новый,
+    поэтому прерванный прогон его не портит. file_count(лист, строка)
+    возвращает число файлов папки строки или None.
+    """
+
+    def __init__(self, snapshot: ScanSnapshot, month: str, root: str, file_count=None):
+        self.snapshot = snapshot
+        self.month = month
+        self.root = root
+        self.started = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.file_count = file_count
+        self.seq = {CHECK_SHEET: 0, NORMATIV_SHEET: 0}
+        self.scan_id = None
+        # отложенная запись: строки ждут commit()
+        self.pending = [] if snapshot.deferred else None
+        if self.pending is None:
+            with snapshot.lock:
+                self.insert_scan()
+
+    def insert_scan(self):
+        db = self.snapshot.db
+        db.execute('DELETE FROM scans WHERE month = ? AND root = ?', (self.month, self.root))
+        self.scan_id = db.execute(
+            'INSERT INTO scans (month, root, started) VALUES (?, ?, ?)', (self.month, self.root, self.started)
+        ).lastrowid
+
+    def write_rows(self, check_rows, normativ_rows):
+        records = []
+        for row in check_rows:
+            records.append(self.record(CHECK_SHEET, row[:4], row[4], row))
+        for row in normativ_rows:
+            records.append(self.record(NORMATIV_SHEET, row[:3] + [None], row[3], row))
+        if self.pending is not None:
+            self.pending.extend(records)
+            return
+        with self.snapshot.lock:
+            self.insert_folders(records)
+
+    def insert_folders(self, records):
+        self.snapshot.db.executemany('INSERT INTO folders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                     [(self.scan_id, *record) for record in records])
+
+    def record(self, sheet, names, flag, row):
+        self.seq[sheet] += 1
+        count = self.file_count(sheet, row) if self.file_count else None
+        return (sheet, self.seq[sheet], *names, flag, count)
+
+    def commit(self):
+        with self.snapshot.lock:
+            if self.pending is not None:
+                self.insert_scan()
+                self.insert_folders(self.pending)
+                self.pending = []
+            self.snapshot.db.execute(
+                'UPDATE scans SET finished = ? WHERE id = ?', (time.strftime('%Y-%m-%dT%H:%M:%S'), self.scan_id)
+            )
+            self.snapshot.db.commit()
+
+    def rollback(self):
+        with self.snapshot.lock:
+            if self.pending is not None:
+                self.pending = []
+                return
+            self.snapshot.db.rollback()
@@ -0,0 +1,49 @@
+"""Определение типа хранилища для подбора числа потоков локального обхода.
+
+На сетевых дисках (SMB/NFS) каждый листинг ждет ответа сервера, и потоков
+нужно много, чтобы держать очередь запросов. На локальном SSD листинг почти
+не ждет, и лишние потоки только спорят за GIL.
+"""
+import os
+import sys
+
+NETWORK_FS_TYPES = {'cifs', 'smb', 'smb2', 'smb3', 'smbfs', 'nfs', 'nfs4', 'fuse.sshfs', 'afs', '9p', 'davfs'}
+
+LOCAL_WORKERS = 4
+NETWORK_WORKERS = 32
+
+
+def is_network_path(path: str) -> bool:
+    path = os.path.abspath(path)
+    if sys.platform == 'win32':
+        if path.startswith('\\\\'):
+            return True  # UNC: \\сервер\папка
+        try:
+            import ctypes
+            drive = os.path.splitdrive(path)[0] + '\\'
+            return ctypes.windll.kernel32.GetDriveTypeW(drive) == 4  # DRIVE_REMOTE
+        except Exception:
+            return False
+    return mount_fs_type(path) in NETWORK_FS_TYPES
+
+
+def mount_fs_type(path: str):
+    """Тип файловой системы точки монтирования, содержащей path (Linux, /proc/mounts)."""
+    try:
+        with open('/proc/mounts', encoding='utf-8') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+    except OSError:
+        return None
+    best = None
+    for mount_point, fs_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if path == mount_point or path.startswith(mount_point.rstrip('/') + '/'):
+            if best is None or len(mount_point) > len(best[0]):
+                best = (mount_point, fs_type)
+    return best[1] if best else None
+
+
+def local_workers(path: str) -> int:
+    if is_network_path(path):
+        return NETWORK_WORKERS
+    return max(2, min(LOCAL_WORKERS, os.cpu_count() or 1))
@@ -0,0 +1,146 @@
+"""Сводные листы отчета: доля проверок с видео и нормативов с материалами.
+
+Строки обоих листов сводятся в одну таблицу показателей и группируются
+одним вызовом groupby на каждый уровень (ЭЧ, руководитель, норматив), без
+циклов по строкам. ЭЧ, руководитель и норматив хранятся как категории с
+общим для обоих листов словарем: повторяющиеся строки занимают по коду на
+строку, а группировка идет по кодам в порядке обхода.
+
+Потоковый отчет строк не хранит: SummaryCounter копит те же показатели
+счетчиками по группам по мере записи, и память зависит от числа ЭЧ,
+руководителей и нормативов, а не от числа строк.
+"""
+from .report import CHECK_COLUMNS, NORMATIV_COLUMNS
+
+# ЭЧ, Руководитель, Норматив
+CATEGORY_COLUMNS = NORMATIV_COLUMNS[:3]
+
+# строки недостающих проверок, которые дописывает Scanner.check_rows
+MISSING_CHECK_NAMES = ('!!!Нет проверки', 'Нет проверки')
+
+SUMMARY_SHEETS = {
+    'Сводка по ЭЧ': ['ЭЧ'],
+    'Сводка по руководителям': ['ЭЧ', 'Руководитель'],
+    'Сводка по нормативам': ['Норматив'],
+}
+
+SUMMARY_COLUMNS = ['Проверок', 'Нет проверки', 'С видео', 'Доля с видео, %',
+                   'Папок нормативов', 'С материалами', 'Доля с материалами, %']
+
+
+def make_frames(check_data, normativ_data):
+    """Таблицы листов "Оперативные" и "Нормативы"; ЭЧ, руководитель и
+    норматив — категории с общим словарем в порядке появления, флаги — int8."""
+    import pandas as pd
+    df_check = pd.DataFrame(check_data, columns=CHECK_COLUMNS)
+    df_normativ = pd.DataFrame(normativ_data, columns=NORMATIV_COLUMNS)
+    for column in CATEGORY_COLUMNS:
+        names = pd.concat([df_check[column], df_normativ[column]], ignore_index=True)
+        dtype = pd.CategoricalDtype(names.drop_duplicates().astype(str))
+        df_check[column] = df_check[column].astype(dtype)
+        df_normativ[column] = df_normativ[column].astype(dtype)
+    df_check[CHECK_COLUMNS[-1]] = df_check[CHECK_COLUMNS[-1]].astype('int8')
+    df_normativ[NORMATIV_COLUMNS[-1]] = df_normativ[NORMATIV_COLUMNS[-1]].astype('int8')
+    return (df_check, df_normativ)
+
+
+def summary_frames(df_check, df_normativ):
+    """{имя листа: таблица} для SUMMARY_SHEETS по таблицам из make_frames."""
+    import pandas as pd
+    missing = df_check['Где проводились'].isin(MISSING_CHECK_NAMES)
+    video = df_check['Наличие видео ОП'].astype(bool)
+    materials = df_normativ['Наличие материалов'].astype(bool)
+    # одна строка показателей на каждую строку обоих листов
+    values = pd.concat([
+        pd.DataFrame({
+            **{column: df_check[column] for column in CATEGORY_COLUMNS},
+            'Проверок': ~missing,
+            'Нет проверки': missing,
+            'С видео': video & ~missing,
+            'Папок нормативов': False,
+            'С материалами': False,
+        }),
+        pd.DataFrame({
+            **{column: df_normativ[column] for column in CATEGORY_COLUMNS},
+            'Проверок': False,
+            'Нет проверки': False,
+            'С видео': False,
+            'Папок нормативов': True,
+            'С материалами': materials,
+        }),
+    ], ignore_index=True)
+
+    frames = {}
+    for sheet, keys in SUMMARY_SHEETS.items():
+        table = values.groupby(keys, observed=True)[
+            ['Проверок', 'Нет проверки', 'С видео', 'Папок нормативов', 'С материалами']
+        ].sum().astype('int64')
+        table['Доля с видео, %'] = percent(table['С видео'], table['Проверок'])
+        table['Доля с материалами, %'] = percent(table['С материалами'], table['Папок нормативов'])
+        frames[sheet] = table[SUMMARY_COLUMNS].reset_index()
+    return frames
+
+
+def percent(part, total):
+    """Доля в процентах с одним знаком; пусто, если знаменатель нулевой."""
+    return (part * 100 / total.where(total > 0)).round(1)
+
+
+class SummaryCounter:
+    """Показатели SUMMARY_SHEETS по группам, накопленные по пачкам строк.
+
+    frames() дает те же таблицы, что summary_frames по всем строкам: группы
+    упорядочены по порядку появления названий сначала на листе "Оперативные",
+    затем на листе "Нормативы".
+    """
+
+    COUNTERS = ['Проверок', 'Нет проверки', 'С видео', 'Папок нормативов', 'С материалами']
+
+    def __init__(self):
+        # по колонке CATEGORY_COLUMNS: названия в порядке появления на каждом листе
+        self.seen = ([{} for _ in CATEGORY_COLUMNS], [{} for _ in CATEGORY_COLUMNS])
+        self.keys = {sheet: [CATEGORY_COLUMNS.index(column) for column in keys]
+                     for sheet, keys in SUMMARY_SHEETS.items()}
+        # лист -> {ключ группы: счетчики COUNTERS}
+        self.groups = {sheet: {} for sheet in SUMMARY_SHEETS}
+
+    def add(self, check_rows, normativ_rows):
+        for ech, person, normativ, check, video in check_rows:
+            missing = check in MISSING_CHECK_NAMES
+            self.count(0, (ech, person, normativ),
+                       (0, 1, 0, 0, 0) if missing else (1, 0, 1 if video else 0, 0, 0))
+        for ech, person, normativ, materials in normativ_rows:
+            self.count(1, (ech, person, normativ), (0, 0, 0, 1, 1 if materials else 0))
+
+    def count(self, sheet_index, names, values):
+        for seen, name in zip(self.seen[sheet_index], names):
+            seen.setdefault(name, len(seen))
+        for sheet, indexes in self.keys.items():
+            key = tuple(names[i] for i in indexes)
+            counters = self.groups[sheet].get(key)
+            if counters is None:
+                counters = self.groups[sheet][key] = [0] * len(values)
+            for i, value in enumerate(values):
+                counters[i] += value
+
+    def frames(self):
+        """{имя листа: таблица} для SUMMARY_SHEETS."""
+        import pandas as pd
+        categories = []
+        for check_seen, normativ_seen in zip(*self.seen):
+            names = list(check_seen) + [name for name in normativ_seen if name not in check_seen]
+            categories.append(pd.CategoricalDtype(names))
+        ranks = [{name: code for code, name in enumerate(dtype.categories)} for dtype in categories]
+
+        frames = {}
+        for sheet, indexes in self.keys.items():
+            groups = sorted(self.groups[sheet].items(),
+                            key=lambda item: tuple(ranks[i][name] for i, name in zip(indexes, item[0])))
+            table = pd.DataFrame([counters for _, counters in groups], columns=self.COUNTERS, dtype='int64')
+            for position, i in enumerate(indexes):
+                table.insert(position, CATEGORY_COLUMNS[i],
+                             pd.Series([key[position] for key, _ in groups], dtype=categories[i]))
+            table['Доля с видео, %'] = percent(table['С видео'], table['Проверок'])
+            table['Доля с материалами, %'] = percent(table['С материалами'], table['Папок нормативов'])
+            frames[sheet] = table[SUMMARY_SHEETS[sheet] + SUMMARY_COLUMNS]
+        return frames
@@ -0,0 +1,465 @@
+"""Обход дерева ЭЧ → руководитель → норматив → проверка по хранилищу любого вида.
+
+Хранилище (Backend) дает листинг папки, путь вложенной папки и начало
+файла. Правила отчета (папка оперативных проверок, пропуск
+Scanner.SKIPPED_CHECK_FOLDER, дополнение до 3/4 проверок, проверка видео и
+материалов) и обработка ошибок одни для всех хранилищ и живут в TreeWalker
+(AsyncTreeWalker — тот же обход для пула asyncio). Хранилища: LocalBackend
+(os.scandir), FtpBackend (одно соединение FTP), MemoryBackend (дерево в
+памяти, для проверок обхода без диска и сервера).
+
+Ошибка отдельной папки руководителя или норматива печатается, и папка
+пропускается; ошибку, после которой хранилищем пользоваться нельзя
+(Backend.is_fatal: обрыв соединения FTP, лимит сессий), обход пробрасывает —
+ЭЧ повторяется после переподключения.
+
+Листинги идут на уровень вперед: получив список папок, обходчик сразу
+просит хранилище подготовить листинги тех из них, которых нет в кэше и
+журнале (Backend.prefetch), и разбирает текущий уровень, пока они
+загружаются. PrefetchBackend делает это пулом потоков над любым синхронным
+хранилищем; в asyncio листинги детей и так запрашиваются одновременно.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .ftp import ftp_join, is_connection_lost, is_session_limit
+from .listing import ListingEntry
+from .metrics import ScanMetrics
+from .video import HEADER_BYTES, is_video_header, read_local_header
+
+
+class Backend:
+    """Хранилище для обхода. list_dir возвращает [ListingEntry]; modify у
+    папок — отметка для кэша листингов (None — папка не кэшируется).
+    materials — правило Scanner.has_materials для этого хранилища."""
+
+    materials = 'files'
+
+    def join(self, path, *names):
+        raise NotImplementedError
+
+    def list_dir(self, path):
+        raise NotImplementedError
+
+    def read_header(self, path, nbytes=HEADER_BYTES):
+        raise NotImplementedError
+
+    def is_fatal(self, error):
+        """Ошибка, после которой обход по этому хранилищу продолжать нельзя."""
+        return False
+
+    def prefetch(self, paths):
+        """Подсказка: листинги этих папок скоро понадобятся."""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class LocalBackend(Backend):
+    """Локальная или сетевая папка через os.scandir.
+
+    stamps=True — у папок в листинге отметка st_mtime_ns; она нужна только
+    кэшу листингов и стоит stat на каждую папку.
+    """
+
+    # локально материалы — любая запись в папке норматива, и вложенная папка тоже
+    materials = 'entries'
+
+    def __init__(self, scanner, metrics=None, stamps=False):
+        self.scanner = scanner
+        self.metrics = metrics
+        self.stamps = stamps
+
+    def join(self, path, *names):
+        return os.path.join(path, *names)
+
+    def list_dir(self, path):
+        return [self.entry(entry) for entry in self.scanner.scan_local(path, self.metrics)]
+
+    def entry(self, entry: os.DirEntry):
+        if not entry.is_dir():
+            return ListingEntry(entry.name, False, *self.scanner.local_video_stat(entry))
+        stamp = None
+        if self.stamps:
+            try:
+                stamp = entry.stat().st_mtime_ns
+            except OSError:
+                pass
+        return ListingEntry(entry.name, True, 0, stamp)
+
+    def read_header(self, path, nbytes=HEADER_BYTES):
+        # заголовки читаются не больше чем VIDEO_SNIFF_WORKERS потоками
+        with self.scanner.sniff_slots:
+            return read_local_header(path, nbytes)
+
+
+class FtpBackend(Backend):
+    """FTP через одно соединение (FtpLister или FtpTreeLister): команды идут
+    по нему по очереди, в том числе из потока PrefetchBackend."""
+
+    def __init__(self, lister):
+        self.lister = lister
+        self.lock = threading.Lock()
+
+    def join(self, path, *names):
+        return ftp_join(path, *names)
+
+    def list_dir(self, path):
+        with self.lock:
+            return self.lister.list_dir(path)
+
+    def read_header(self, path, nbytes=HEADER_BYTES):
+        with self.lock:
+            return self.lister.read_header(path, nbytes)
+
+    def is_fatal(self, error):
+        return is_connection_lost(error) or is_session_limit(error)
+
+
+class MemoryBackend(Backend):
+    """Дерево в памяти: {путь папки: [ListingEntry или список полей]} и
+    {путь файла: начало файла}. Пути через '/', как на FTP."""
+
+    def __init__(self, tree, headers=None, materials='files'):
+        self.tree = {path.rstrip('/') or '/': [ListingEntry(*entry) for entry in entries]
+                     for path, entries in tree.items()}
+        self.headers = headers or {}
+        self.materials = materials
+
+    def join(self, path, *names):
+        return ftp_join(path, *names)
+
+    def list_dir(self, path):
+        entries = self.tree.get(path.rstrip('/') or '/')
+        if entries is None:
+            raise FileNotFoundError(path)
+        return list(entries)
+
+    def read_header(self, path, nbytes=HEADER_BYTES):
+        return self.headers.get(path, b'')[:nbytes]
+
+
+class PrefetchBackend(Backend):
+    """Листинги на уровень вперед над любым синхронным хранилищем.
+
+    prefetch(paths) ставит листинги в очередь пула потоков, list_dir
+    забирает готовый результат; листинг, до которого пул еще не дошел,
+    выполняется сразу в вызывающем потоке. В очереди не больше LIMIT папок,
+    остальные читаются по требованию.
+    """
+
+    LIMIT = 256
+
+    def __init__(self, backend: Backend, workers=1):
+        self.backend = backend
+        self.materials = backend.materials
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='prefetch')
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def join(self, path, *names):
+        return self.backend.join(path, *names)
+
+    def read_header(self, path, nbytes=HEADER_BYTES):
+        return self.backend.read_header(path, nbytes)
+
+    def is_fatal(self, error):
+        return self.backend.is_fatal(error)
+
+    def prefetch(self, paths):
+        with self.lock:
+            for path in paths:
+                if len(self.pending) >= self.LIMIT:
+                    break
+                if path not in self.pending:
+                    self.pending[path] = self.executor.submit(self.backend.list_dir, path)
+
+    def list_dir(self, path):
+        with self.lock:
+            future = self.pending.pop(path, None)
+        if future is None or future.cancel():
+            return self.backend.list_dir(path)
+        return future.result()
+
+    def close(self):
+        # несобранные листинги отменяются; начатый дожидается, чтобы
+        # соединение FTP вернулось в пул свободным
+        with self.lock:
+            self.pending.clear()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class Walker:
+    """Общее для синхронного и asyncio обхода: кэш, журнал, ошибки папок."""
+
+    def __init__(self, scanner, backend, cache=None, metrics=None, journal=None):
+        self.scanner = scanner
+        self.backend = backend
+        self.cache = cache
+        self.metrics = metrics or ScanMetrics()
+        self.journal = journal
+        # папки, пропущенные из-за ошибок: ЭЧ с ними не записывается в журнал целиком
+        self.errors = []
+
+    def cached(self, path, stamp):
+        return self.cache is not None and self.cache.cached(path, stamp) is not None
+
+    def journaled(self, path):
+        return self.journal is not None and path in self.journal.normativs
+
+    def fresh_check(self, path, stamp):
+        """Листинг папки проверки будет запрошен у хранилища, а не взят из кэша."""
+        return self.scanner.fresh_video_listing() or not self.cached(path, stamp)
+
+    def needs_listing(self, normativ, path):
+        """Понадобится ли листинг папки норматива: журнал и кэш его заменяют,
+        а список проверок читается всегда."""
+        if self.journaled(path):
+            return False
+        return self.scanner.is_check_folder(normativ.name) or not self.cached(path, normativ.modify)
+
+    def check_folders(self, folders):
+        return [(entry, path) for entry, path in folders if entry.name != self.scanner.SKIPPED_CHECK_FOLDER]
+
+    def skip(self, path, error):
+        """Ошибка папки: фатальная для хранилища пробрасывается, иначе папка пропускается."""
+        if self.backend.is_fatal(error):
+            raise error
+        print(f"Ошибка обработки {path}: {error}")
+        self.errors.append(path)
+
+
+class TreeWalker(Walker):
+    """Обход и правила отчета над синхронным Backend. Экземпляр можно делить
+    между потоками: локальный режим обходит нормативы параллельно."""
+
+    def subfolders(self, path):
+        return [(entry, self.backend.join(path, entry.name)) for entry in self.backend.list_dir(path) if entry.is_dir]
+
+    def listing(self, path, stamp, fresh=False):
+        if self.cache is None:
+            return self.backend.list_dir(path)
+        if fresh:
+            entries = self.backend.list_dir(path)
+            self.cache.store(path, stamp, entries)
+            return entries
+        return self.cache.listing(path, stamp, self.backend.list_dir)
+
+    def plan(self, ech_path):
+        """Папки нормативов ЭЧ в порядке обхода: [(руководитель, ListingEntry норматива, путь)]."""
+        self.scanner.check_cancelled()
+        persons = self.subfolders(ech_path)
+        self.backend.prefetch([path for _, path in persons])
+        units = []
+        for person, person_path in persons:
+            try:
+                normativs = self.subfolders(person_path)
+            except Exception as e:
+                self.skip(person_path, e)
+                continue
+            self.backend.prefetch([path for normativ, path in normativs if self.needs_listing(normativ, path)])
+            units.extend((person.name, normativ, path) for normativ, path in normativs)
+        return units
+
+    def ech_rows(self, ech_name, ech_path):
+        check_data = []
+        normativ_data = []
+        for person_name, normativ, path in self.plan(ech_path):
+            check_rows, normativ_rows = self.normativ_rows(ech_name, person_name, normativ, path)
+            check_data.extend(check_rows)
+            normativ_data.extend(normativ_rows)
+        return (check_data, normativ_data)
+
+    def rows(self, root):
+        """Строки всего дерева от корня, ЭЧ по порядку."""
+        check_data = []
+        normativ_data = []
+        for ech, ech_path in self.subfolders(root):
+            check_rows, normativ_rows = self.ech_rows(ech.name, ech_path)
+            check_data.extend(check_rows)
+            normativ_data.extend(normativ_rows)
+        return (check_data, normativ_data)
+
+    def normativ_rows(self, ech_name, person_name, normativ, path):
+        """(строки "Оперативные", строки "Нормативы") папки норматива."""
+        self.scanner.check_cancelled()
+        done = self.journal.normativ(path) if self.journal is not None else None
+        if done is not None:
+            return done
+        try:
+            rows = self.folder_rows(ech_name, person_name, normativ, path)
+        except Exception as e:
+            self.skip(path, e)
+            return ([], [])
+        if self.journal is not None:
+            self.journal.record_normativ(path, *rows)
+        return rows
+
+    def folder_rows(self, ech_name, person_name, normativ, path):
+        if not self.scanner.is_check_folder(normativ.name):
+            entries = self.listing(path, normativ.modify)
+            return ([], [self.scanner.normativ_row(ech_name, person_name, normativ.name, entries,
+                                                   self.backend.materials)])
+        checks = self.check_folders(self.subfolders(path))
+        self.backend.prefetch([check_path for check, check_path in checks if self.fresh_check(check_path, check.modify)])
+        results = []
+        for check, check_path in checks:
+            self.scanner.check_cancelled()
+            results.append((check.name, self.has_video(check_path, check.modify)))
+        with self.metrics.phase('rules'):
+            return (self.scanner.check_rows(ech_name, person_name, normativ.name, results), [])
+
+    def has_video(self, path, stamp):
+        """Есть ли в папке проверки видео (см. Scanner.VIDEO_VALIDATION);
+        ошибка листинга или чтения — видео нет."""
+        try:
+            entries = self.listing(path, stamp, fresh=self.scanner.fresh_video_listing())
+            verdict, names = self.scanner.video_verdict(path, entries, self.cache, stamp)
+            if verdict is None:
+                with self.metrics.phase('video'):
+                    verdict = any(is_video_header(self.read_header(self.backend.join(path, name))) for name in names)
+                if self.cache is not None:
+                    self.cache.store_verdict(path, verdict, self.scanner.video_signature(entries))
+            return verdict
+        except Exception as e:
+            if self.backend.is_fatal(e):
+                raise
+            return False
+
+    def read_header(self, path):
+        try:
+            return self.backend.read_header(path, HEADER_BYTES)
+        except Exception as e:
+            if self.backend.is_fatal(e):
+                raise
+            return b''
+
+
+class AsyncPoolBackend:
+    """Хранилище для AsyncTreeWalker поверх inspection.async_ftp.AsyncFtpPool."""
+
+    materials = 'files'
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def join(self, path, *names):
+        return ftp_join(path, *names)
+
+    async def list_dir(self, path):
+        return await self.pool.list_dir(path)
+
+    async def read_header(self, path, nbytes=HEADER_BYTES):
+        return await self.pool.read_header(path, nbytes)
+
+    def is_fatal(self, error):
+        return is_connection_lost(error) or is_session_limit(error)
+
+
+class AsyncTreeWalker(Walker):
+    """Тот же обход для asyncio: list_dir и read_header хранилища — корутины,
+    папки одного уровня обходятся одновременно."""
+
+    async def subfolders(self, path):
+        return [(entry, self.backend.join(path, entry.name))
+                for entry in await self.backend.list_dir(path) if entry.is_dir]
+
+    async def listing(self, path, stamp, fresh=False):
+        # как ListingCache.listing: попадание тоже переносится в текущую
+        # область, иначе save() его не сохранит
+        if self.cache is None:
+            return await self.backend.list_dir(path)
+        entries = None if fresh else self.cache.lookup(path, stamp)
+        if entries is None:
+            entries = await self.backend.list_dir(path)
+        self.cache.store(path, stamp, entries)
+        return entries
+
+    async def ech_rows(self, ech_name, ech_path):
+        persons = await self.subfolders(ech_path)
+        check_data = []
+        normativ_data = []
+        for person_rows in await gather_all(self.person_rows(ech_name, person.name, path) for person, path in persons):
+            for check_rows, normativ_rows in person_rows:
+                check_data.extend(check_rows)
+                normativ_data.extend(normativ_rows)
+        return (check_data, normativ_data)
+
+    async def person_rows(self, ech_name, person_name, person_path):
+        try:
+            normativs = await self.subfolders(person_path)
+        except Exception as e:
+            self.skip(person_path, e)
+            return []
+        return await gather_all(self.normativ_rows(ech_name, person_name, normativ, path)
+                                for normativ, path in normativs)
+
+    async def normativ_rows(self, ech_name, person_name, normativ, path):
+        self.scanner.check_cancelled()
+        done = self.journal.normativ(path) if self.journal is not None else None
+        if done is not None:
+            return done
+        try:
+            rows = await self.folder_rows(ech_name, person_name, normativ, path)
+        except Exception as e:
+            self.skip(path, e)
+            return ([], [])
+        if self.journal is not None:
+            self.journal.record_normativ(path, *rows)
+        return rows
+
+    async def folder_rows(self, ech_name, person_name, normativ, path):
+        if not self.scanner.is_check_folder(normativ.name):
+            entries = await self.listing(path, normativ.modify)
+            return ([], [self.scanner.normativ_row(ech_name, person_name, normativ.name, entries,
+                                                   self.backend.materials)])
+        checks = self.check_folders(await self.subfolders(path))
+        videos = await gather_all(self.has_video(check_path, check.modify) for check, check_path in checks)
+        results = [(check.name, video) for (check, _), video in zip(checks, videos)]
+        with self.metrics.phase('rules'):
+            return (self.scanner.check_rows(ech_name, person_name, normativ.name, results), [])
+
+    async def has_video(self, path, stamp):
+        self.scanner.check_cancelled()
+        try:
+            entries = await self.listing(path, stamp, fresh=self.scanner.fresh_video_listing())
+            verdict, names = self.scanner.video_verdict(path, entries, self.cache, stamp)
+            if verdict is None:
+                with self.metrics.phase('video'):
+                    verdict = False
+                    for name in names:
+                        if is_video_header(await self.read_header(self.backend.join(path, name))):
+                            verdict = True
+                            break
+                if self.cache is not None:
+                    self.cache.store_verdict(path, verdict, self.scanner.video_signature(entries))
+            return verdict
+        except Exception as e:
+            if self.backend.is_fatal(e):
+                raise
+            return False
+
+    async def read_header(self, path):
+        try:
+            return await self.backend.read_header(path, HEADER_BYTES)
+        except Exception as e:
+            if self.backend.is_fatal(e):
+                raise
+            return b''
+
+
+async def gather_all(coros):
+    """Как asyncio.gather, но дожидается всех задач, прежде чем пробросить первую ошибку."""
+    results = await asyncio.gather(*coros, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
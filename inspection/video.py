@@ -0,0 +1,50 @@
+"""Проверка, что файл с расширением видео действительно похож на видео.
+
+Режимы (Scanner.VIDEO_VALIDATION):
+    'extension' — достаточно расширения из VIDEO_EXTENSIONS;
+    'size'      — и размер из уже полученного листинга не меньше
+                  VIDEO_MIN_SIZE (0-байтные и оборванные загрузки не считаются);
+    'header'    — и первые HEADER_BYTES байт содержат сигнатуру контейнера.
+
+Для сигнатуры читается только начало файла: локально — os.pread, на FTP —
+RETR, после которого канал данных закрывается, не дожидаясь конца файла.
+
+В режимах 'size' и 'header' папки проверок листаются заново при каждом
+прогоне: дозапись файла не меняет отметки папки, и размеры из кэша листингов
+могли устареть. Вывод о сигнатурах кэшируется вместе с именами, размерами и
+отметками файлов и действует, пока они не изменились.
+"""
+import os
+
+VIDEO_VALIDATION_MODES = ('extension', 'size', 'header')
+
+HEADER_BYTES = 2048
+
+# атомы верхнего уровня, с которых начинаются MP4 и QuickTime MOV
+QUICKTIME_ATOMS = {b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot'}
+MPEG_TS_PACKET = 188
+
+
+def is_video_header(header: bytes) -> bool:
+    if len(header) >= 8 and header[4:8] in QUICKTIME_ATOMS:
+        return True
+    if header[:4] == b'RIFF' and header[8:12] == b'AVI ':
+        return True
+    if header[:4] == b'\x1a\x45\xdf\xa3':  # EBML: Matroska, WebM
+        return True
+    if header[:4] in (b'\x00\x00\x01\xba', b'\x00\x00\x01\xb3'):  # MPEG PS: pack header, sequence header
+        return True
+    # MPEG-TS: байт синхронизации в начале каждого пакета
+    return len(header) > 2 * MPEG_TS_PACKET and all(
+        header[i * MPEG_TS_PACKET] == 0x47 for i in range(3)
+    )
+
+
+def read_local_header(path: str, nbytes=HEADER_BYTES) -> bytes:
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        if hasattr(os, 'pread'):
+            return os.pread(fd, nbytes, 0)
+        return os.read(fd, nbytes)
+    finally:
+        os.close(fd)
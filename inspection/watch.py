@@ -0,0 +1,310 @@
+"""Наблюдение за локальной или сетевой папкой: результат проверки всегда актуален.
+
+Первый обход, как и process_local, считает папки нормативов параллельно
+(LOCAL_MAX_WORKERS или по типу диска); после него пересчитываются только
+затронутые папки:
+событие внутри папки норматива (или проверки в ней) пересчитывает этот
+норматив, а на уровнях ЭЧ и руководителя перечитывается только листинг
+папки, и целиком обходятся лишь появившиеся в ней новые папки.
+События копятся, пока не наступит пауза DEBOUNCE секунд, поэтому
+копирование сотен файлов дает один пересчет.
+
+Источник событий — пакет watchdog (inotify и аналоги), если он установлен
+и папка не на сетевом диске. Иначе раз в POLL_INTERVAL секунд сверяются
+отметки изменения известных папок: новая папка или файл меняет отметку
+родителя, поэтому листинги заново не читаются. Дописанный файл отметку
+папки не меняет, поэтому в режимах проверки видео 'size' и 'header'
+сверяются еще размер и отметка файлов видео в папках проверок.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .report import open_report
+from .storage import is_network_path, local_workers
+
+
+class LocalWatcher:
+    """on_update(check_data, normativ_data) вызывается после первого обхода
+    и после каждого пересчета, из рабочего потока наблюдателя."""
+
+    DEBOUNCE = 2.0
+    POLL_INTERVAL = 30.0
+
+    def __init__(self, scanner, path, month, on_update=None, debounce=None, poll_interval=None, use_events=None):
+        self.scanner = scanner
+        self.root = os.path.abspath(path)
+        self.month = month
+        self.on_update = on_update
+        self.debounce = self.DEBOUNCE if debounce is None else debounce
+        self.poll_interval = poll_interval or self.POLL_INTERVAL
+        self.use_events = use_events
+        self.lock = threading.RLock()
+        self.tree = {}
+        self.stamps = {}
+        self.dirty = set()
+        self.last_event = 0.0
+        self.updates = 0
+        self.observer = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    # ---------- запуск и остановка ----------
+    def start(self):
+        self.scanner.cancel_event.clear()
+        if self.use_events is None:
+            self.use_events = not is_network_path(self.root)
+        if self.use_events:
+            # наблюдение начинается до обхода: изменения во время него
+            # копятся в dirty и пересчитываются сразу после
+            try:
+                self.observer = self.start_observer()
+            except ImportError:
+                print("Пакет watchdog не установлен, изменения отслеживаются опросом папок")
+                self.use_events = False
+        with self.lock:
+            self.update([()])
+        self.notify()
+        if self.stopped.is_set():
+            return self  # остановлен во время первого обхода
+        self.thread = threading.Thread(target=self.run, name='LocalWatcher', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start_observer(self):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ('opened', 'closed_no_write'):
+                    return
+                watcher.on_path_event(event.src_path, event.is_directory)
+                if getattr(event, 'dest_path', ''):
+                    watcher.on_path_event(event.dest_path, event.is_directory)
+
+        observer = Observer()
+        observer.schedule(Handler(), self.root, recursive=True)
+        observer.start()
+        return observer
+
+    # ---------- события ----------
+    def on_path_event(self, path, is_dir):
+        prefix = self.event_prefix(path, is_dir)
+        if prefix is not None:
+            self.mark(prefix)
+
+    def event_prefix(self, path, is_dir):
+        """Какую часть дерева пересчитать: () — список ЭЧ, (ЭЧ,), (ЭЧ, руководитель)
+        или (ЭЧ, руководитель, норматив)."""
+        if isinstance(path, bytes):
+            path = os.fsdecode(path)
+        rel = os.path.relpath(os.path.abspath(path), self.root)
+        if rel == '.':
+            return ()
+        parts = rel.split(os.sep)
+        if parts[0] == '..':
+            return None
+        if len(parts) > 3:
+            return tuple(parts[:3])
+        # файлы выше папок нормативов на результат не влияют
+        if not is_dir:
+            return None
+        return tuple(parts[:-1])
+
+    def mark(self, prefix):
+        with self.lock:
+            self.dirty.add(prefix)
+            self.last_event = time.monotonic()
+
+    # ---------- рабочий поток ----------
+    def run(self):
+        next_poll = time.monotonic() + self.poll_interval
+        while not self.stopped.wait(min(0.5, self.debounce or 0.5)):
+            now = time.monotonic()
+            if not self.use_events and now >= next_poll:
+                self.poll()
+                next_poll = now + self.poll_interval
+            with self.lock:
+                ready = self.dirty and now - self.last_event >= self.debounce
+            if ready:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Ошибка пересчета: {e}")
+
+    def poll(self):
+        with self.lock:
+            stamps = list(self.stamps.items())
+        for path, (prefix, stamp) in stamps:
+            current = file_stamp(path)
+            if current != stamp:
+                # пропавшая папка пересчитывается уровнем выше, а пропавшая
+                # проверка или файл — своим нормативом
+                gone = current is None and path == os.path.join(self.root, *prefix)
+                self.mark(prefix[:-1] if gone else prefix)
+
+    def flush(self):
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+            self.update(sorted(dirty, key=len))
+            self.updates += 1
+        self.notify()
+
+    def notify(self):
+        if self.on_update:
+            self.on_update(*self.rows())
+
+    # ---------- дерево ----------
+    def update(self, prefixes):
+        """Пересчет папок prefixes (сначала верхние уровни). Новые папки
+        нормативов собираются в список и считаются параллельно."""
+        pending = []
+        for prefix in prefixes:
+            self.refresh(prefix, pending)
+        if not pending:
+            return
+        workers = min(len(pending), self.scanner.LOCAL_MAX_WORKERS or local_workers(self.root))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(lambda item: self.entry_rows(*item), pending)
+            for (prefix, _), rows in zip(pending, results):
+                parent = self.subtree(prefix[:-1])
+                if parent is not None and prefix[-1] in parent:
+                    parent[prefix[-1]] = rows
+
+    def refresh(self, prefix, pending=None):
+        """Перечитывает папку prefix: для норматива — пересчет строк, для
+        уровней выше — новый листинг, где уже известные вложенные папки
+        сохраняются, а новые обходятся целиком. Новые папки нормативов
+        попадают в pending, если он передан."""
+        parent = self.subtree(prefix[:-1]) if prefix else None
+        if prefix and parent is None:
+            if os.path.isdir(os.path.join(self.root, *prefix[:-1])):
+                self.refresh(prefix[:-1], pending)
+            return
+        path = os.path.join(self.root, *prefix)
+        if prefix and not os.path.isdir(path):
+            parent.pop(prefix[-1], None)
+            self.forget(prefix)
+            return
+        if len(prefix) == 3:
+            self.forget(prefix)
+            parent[prefix[-1]] = self.normativ_rows(prefix, path)
+            return
+
+        old = self.subtree(prefix) or {}
+        node = {}
+        entries = {}
+        self.stamp(path, prefix)
+        for entry in self.scanner.scan_local(path):
+            if entry.is_dir():
+                node[entry.name] = old.get(entry.name, {})
+                entries[entry.name] = entry
+        for name in old.keys() - node.keys():
+            self.forget(prefix + (name,))
+        if prefix:
+            parent[prefix[-1]] = node
+        else:
+            self.tree = node
+        for name in node.keys() - old.keys():
+            if len(prefix) == 2 and pending is not None:
+                node[name] = ([], [])
+                pending.append((prefix + (name,), entries[name]))
+            else:
+                self.refresh(prefix + (name,), pending)
+
+    def normativ_rows(self, prefix, path):
+        try:
+            for normativ in self.scanner.scan_local(os.path.dirname(path)):
+                if normativ.name == prefix[-1]:
+                    return self.entry_rows(prefix, normativ)
+        except Exception as e:
+            print(f"Ошибка обработки {prefix[0]}: {e}")
+        return ([], [])
+
+    def entry_rows(self, prefix, normativ):
+        """Строки папки норматива normativ (os.DirEntry) и отметки ее папок."""
+        try:
+            rows = self.scanner.process_normativ_local(prefix[0], prefix[1], normativ)
+            self.stamp(normativ.path, prefix)
+            if self.scanner.is_check_folder(normativ.name):
+                for check in self.scanner.scan_local(normativ.path):
+                    if check.is_dir():
+                        self.stamp(check.path, prefix)
+                        if not self.use_events and self.scanner.fresh_video_listing():
+                            self.stamp_videos(check.path, prefix)
+            return rows
+        except Exception as e:
+            print(f"Ошибка обработки {prefix[0]}: {e}")
+        return ([], [])
+
+    def subtree(self, prefix):
+        node = self.tree
+        for name in prefix:
+            node = node.get(name)
+            if node is None:
+                return None
+        return node
+
+    def stamp(self, path, prefix):
+        stamp = file_stamp(path)
+        if stamp is not None:
+            self.stamps[path] = (prefix, stamp)
+
+    def stamp_videos(self, path, prefix):
+        for entry in self.scanner.scan_local(path):
+            if not entry.is_dir() and self.scanner.is_video_file(entry.name):
+                self.stamp(entry.path, prefix)
+
+    def forget(self, prefix):
+        n = len(prefix)
+        for path, (stamp_prefix, _) in list(self.stamps.items()):
+            if stamp_prefix[:n] == prefix:
+                del self.stamps[path]
+
+    # ---------- результат ----------
+    def rows(self):
+        """Текущие строки листов в порядке обхода: (check_data, normativ_data)."""
+        check_data = []
+        normativ_data = []
+        with self.lock:
+            for persons in self.tree.values():
+                for normativs in persons.values():
+                    for check_rows, normativ_rows in normativs.values():
+                        check_data.extend(check_rows)
+                        normativ_data.extend(normativ_rows)
+        return (check_data, normativ_data)
+
+    def export(self, output_file: str, summary=True):
+        check_data, normativ_data = self.rows()
+        with open_report(output_file, summary) as report:
+            report.write_rows(check_data, normativ_data)
+        return (report.check_count, report.normativ_count)
+
+
+def file_stamp(path):
+    """(st_mtime_ns, st_size) или None, если файла уже нет."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
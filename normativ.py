@@ -1,11 +1,7 @@
-import os
-import pandas as pd
 import time
 import sys
-from ftplib import FTP, error_perm, all_errors
-from urllib.parse import urlparse, unquote
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from PyQt6.QtCore import QSize, Qt, QThread, pyqtSignal
+import threading
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, QSize, Qt, QThread, pyqtSignal
 from PyQt6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -16,17 +12,74 @@ from PyQt6.QtWidgets import (
     QVBoxLayout,
     QHBoxLayout,
     QComboBox,
+    QCheckBox,
     QMessageBox,
     QFileDialog,
-    QProgressBar
+    QProgressBar,
+    QTabWidget,
+    QTableView
 )
+from inspection.engine import (
+    MONTH_FILE,
+    PATH_FILE,
+    CREDENTIALS_FILE,
+    METRICS_FILE,
+    SNAPSHOT_FILE,
+    ScanCancelled,
+    Scanner,
+    default_output_file,
+    ensure_config_files,
+    read_file_with_encoding,
+    read_ftp_credentials,
+    scan_to_report,
+)
+from inspection.metrics import ScanMetrics
+from inspection.report import CHECK_COLUMNS, CHECK_SHEET, NORMATIV_COLUMNS, NORMATIV_SHEET, open_report
+from inspection.watch import LocalWatcher
+
+class ReportTableModel(QAbstractTableModel):
+    """Строки листа отчета; новые строки дописываются в конец без перестроения таблицы."""
+
+    def __init__(self, columns):
+        super().__init__()
+        self.columns = columns
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and index.isValid():
+            return str(self.rows[index.row()][index.column()])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.columns[section]
+        return None
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = list(rows)
+        self.endResetModel()
 
-start = time.time()
 
 class WorkerThread(QThread):
     finished = pyqtSignal(object, object)
     error = pyqtSignal(str)
     progress = pyqtSignal(int)
+    cancelled = pyqtSignal()
 
     def __init__(self, func, *args, **kwargs):
         super().__init__()
@@ -38,38 +91,27 @@ class WorkerThread(QThread):
         try:
             result = self.func(*self.args, **self.kwargs, progress_callback=self.progress.emit)
             self.finished.emit(result[0], result[1])
+        except ScanCancelled:
+            self.cancelled.emit()
         except Exception as e:
             self.error.emit(str(e))
 
+
 class MainWindow(QMainWindow):
-    VIDEO_EXTENSIONS = {'.mov', '.avi', '.mp4', '.mpeg', '.MP4', '.MOV', '.AVI', '.MPEG', '.mkv', '.MKV'}
+    # сигналы приходят из рабочих потоков проверки и наблюдателя
+    rows_ready = pyqtSignal(object, object)
+    watch_updated = pyqtSignal(object, object)
+    watch_failed = pyqtSignal(str)
 
     def __init__(self):
         super().__init__()
 
-        # Создаем файлы конфигурации, если отсутствуют
-        if not os.path.exists('inspection_path.txt'):
-            with open('inspection_path.txt', 'w', encoding='utf-8') as p:
-                p.write('Укажите путь')
-        if not os.path.exists('inspection_month.txt'):
-            with open('inspection_month.txt', 'w', encoding='utf-8') as m:
-                m.write('месяц год')
-        if not os.path.exists('ftp_credentials.txt'):
-            with open('ftp_credentials.txt', 'w', encoding='utf-8') as f:
-                f.write('login\npassword')
-
-        path = self.read_file_with_encoding("inspection_path.txt")
-        month = self.read_file_with_encoding("inspection_month.txt")
-
-        ftp_login = ''
-        ftp_password = ''
-        try:
-            with open("ftp_credentials.txt", encoding='utf-8') as f:
-                creds = f.read().split('\n')
-                ftp_login = creds[0] if len(creds) > 0 else ''
-                ftp_password = creds[1] if len(creds) > 1 else ''
-        except Exception:
-            pass
+        self.scanner = Scanner()
+        ensure_config_files()
+
+        path = read_file_with_encoding(PATH_FILE)
+        month = read_file_with_encoding(MONTH_FILE)
+        ftp_login, ftp_password = read_ftp_credentials()
 
         self.setWindowTitle("Проверка нормативов и оперативных проверок")
 
@@ -98,6 +140,27 @@ class MainWindow(QMainWindow):
         self.button_check = QPushButton("Проверить")
         self.button_check.clicked.connect(self.start_check)
 
+        self.checkbox_full_rescan = QCheckBox("Полное пересканирование (без кэша и журнала прогона)")
+        self.checkbox_watch = QCheckBox("Следить за изменениями (только локальная папка)")
+
+        self.button_cancel = QPushButton("Отмена")
+        self.button_cancel.clicked.connect(self.cancel_check)
+        self.button_cancel.setVisible(False)
+
+        self.button_export = QPushButton("Выгрузить строки из таблицы")
+        self.button_export.clicked.connect(self.export_table)
+        self.button_export.setVisible(False)
+
+        # Результаты: строки появляются по мере обработки ЭЧ
+        self.check_model = ReportTableModel(CHECK_COLUMNS)
+        self.normativ_model = ReportTableModel(NORMATIV_COLUMNS)
+        self.tabs = QTabWidget()
+        for model, title in ((self.check_model, CHECK_SHEET), (self.normativ_model, NORMATIV_SHEET)):
+            view = QTableView()
+            view.setModel(model)
+            view.horizontalHeader().setStretchLastSection(True)
+            self.tabs.addTab(view, title)
+
         self.button_save_month = QPushButton("Сохранить месяц")
         self.button_save_month.clicked.connect(self.save_month)
 
@@ -135,27 +198,28 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.line_edit_ftp_password)
         layout.addWidget(self.button_save_ftp)
 
+        layout.addWidget(self.checkbox_full_rescan)
+        layout.addWidget(self.checkbox_watch)
         layout.addWidget(self.button_check)
+        layout.addWidget(self.button_cancel)
         layout.addWidget(self.progress_bar)
         layout.addWidget(self.label)
+        layout.addWidget(self.tabs, 1)
+        layout.addWidget(self.button_export)
 
         container.setLayout(layout)
-        self.setFixedSize(QSize(600, 550))
+        self.setMinimumSize(QSize(600, 640))
+        self.resize(QSize(900, 900))
         self.setCentralWidget(container)
 
         self.worker_thread = None
-
-    def read_file_with_encoding(self, file_path: str) -> str:
-        encodings = ['utf-8', 'cp1251', 'windows-1251']
-        for enc in encodings:
-            try:
-                with open(file_path, 'r', encoding=enc) as f:
-                    content = f.read()
-                    _ = content.encode('utf-8', errors='strict')
-                    return content
-            except (UnicodeDecodeError, UnicodeEncodeError, FileNotFoundError):
-                continue
-        return ''
+        self.output_file = None
+        self.started = None
+        self.watcher = None
+        self.partial = False
+        self.rows_ready.connect(self.on_rows_ready)
+        self.watch_updated.connect(self.on_watch_updated)
+        self.watch_failed.connect(self.on_watch_failed)
 
     def browse_folder(self):
         if self.combo_source_type.currentText() == "FTP сервер":
@@ -178,21 +242,24 @@ class MainWindow(QMainWindow):
             self.button_browse.setEnabled(True)
 
     def save_month(self):
-        with open("inspection_month.txt", "w", encoding='utf-8') as m:
+        with open(MONTH_FILE, "w", encoding='utf-8') as m:
             m.write(self.line_edit_month.text())
         QMessageBox.information(self, "Успех", "Месяц сохранен!")
 
     def save_path(self):
-        with open("inspection_path.txt", "w", encoding='utf-8') as p:
+        with open(PATH_FILE, "w", encoding='utf-8') as p:
             p.write(self.line_edit_path.text())
         QMessageBox.information(self, "Успех", "Путь сохранен!")
 
     def save_ftp_credentials(self):
-        with open("ftp_credentials.txt", "w", encoding='utf-8') as f:
+        with open(CREDENTIALS_FILE, "w", encoding='utf-8') as f:
             f.write(f"{self.line_edit_ftp_login.text()}\n{self.line_edit_ftp_password.text()}")
         QMessageBox.information(self, "Успех", "Учетные данные FTP сохранены!")
 
     def start_check(self):
+        if self.watcher is not None:
+            self.stop_watch()
+            return
         path = self.line_edit_path.text().strip()
         month = self.line_edit_month.text().strip()
 
@@ -203,289 +270,158 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Укажите месяц и год!")
             return
 
+        if self.checkbox_watch.isChecked() and self.combo_source_type.currentText() != "FTP сервер":
+            self.start_watch(path, month)
+            return
+
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
         self.button_check.setEnabled(False)
+        self.button_cancel.setEnabled(True)
+        self.button_cancel.setVisible(True)
+        self.button_export.setVisible(True)
         self.label.setText("Выполняется проверка...")
-
+        self.check_model.set_rows([])
+        self.normativ_model.set_rows([])
+        self.partial = True
+
+        self.started = time.time()
+        force_rescan = self.checkbox_full_rescan.isChecked()
+        # Строки пишутся в отчет по мере обхода ЭЧ, прямо из рабочего потока,
+        # и через событие 'rows' попадают в таблицу окна
+        metrics = ScanMetrics(hooks=[self.on_scan_event])
+        self.output_file = default_output_file(month)
         if self.combo_source_type.currentText() == "FTP сервер":
             self.worker_thread = WorkerThread(
-                self.process_ftp,
+                scan_to_report,
+                self.scanner.process_ftp,
+                self.output_file,
                 path,
                 month,
                 self.line_edit_ftp_login.text(),
-                self.line_edit_ftp_password.text()
+                self.line_edit_ftp_password.text(),
+                force_rescan=force_rescan,
+                snapshot_file=SNAPSHOT_FILE,
+                metrics=metrics
             )
         else:
-            self.worker_thread = WorkerThread(self.process_local, path, month)
+            self.worker_thread = WorkerThread(
+                scan_to_report,
+                self.scanner.process_local,
+                self.output_file,
+                path,
+                month,
+                force_rescan=force_rescan,
+                snapshot_file=SNAPSHOT_FILE,
+                metrics=metrics
+            )
 
         self.worker_thread.finished.connect(self.on_task_finished)
         self.worker_thread.error.connect(self.on_task_error)
+        self.worker_thread.cancelled.connect(self.on_task_cancelled)
         self.worker_thread.progress.connect(self.progress_bar.setValue)
         self.worker_thread.start()
 
-    def on_task_finished(self, df_check, df_normativ):
-        month = self.line_edit_month.text().strip()
-        output_file = f"{os.getcwd()}{os.sep}Проверки {month}.xlsx"
+    def on_scan_event(self, event, data):
+        # вызывается в рабочем потоке, в окно строки передаются сигналом
+        if event == 'rows':
+            self.rows_ready.emit(data['check'], data['normativ'])
+
+    def on_rows_ready(self, check_rows, normativ_rows):
+        self.check_model.append_rows(check_rows)
+        self.normativ_model.append_rows(normativ_rows)
+
+    def cancel_check(self):
+        self.scanner.cancel()
+        self.button_cancel.setEnabled(False)
+        self.label.setText("Остановка проверки...")
+
+    def on_task_cancelled(self):
+        self.label.setText(f"Проверка остановлена. Собрано строк: оперативных {len(self.check_model.rows)}, "
+                           f"нормативов {len(self.normativ_model.rows)}")
+        self.progress_bar.setVisible(False)
+        self.button_cancel.setVisible(False)
+        self.button_check.setEnabled(True)
+
+    def export_table(self):
+        stem = self.output_file[:-len('.xlsx')] if self.output_file else 'Проверки'
+        default = f"{stem} (частично).xlsx" if self.partial else f"{stem}.xlsx"
+        file_name, _ = QFileDialog.getSaveFileName(
+            self, "Сохранить отчет", default, "Excel (*.xlsx);;CSV (*.csv);;Parquet (*.parquet)"
+        )
+        if not file_name:
+            return
         try:
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                df_check.to_excel(writer, sheet_name='Оперативные', index=False)
-                df_normativ.to_excel(writer, sheet_name='Нормативы', index=False)
-            finish = time.time()
-            res = finish - start
-            self.label.setText(f"Выполнено за {round(res, 2)} секунд!\nСохранено в:\n{output_file}")
-            QMessageBox.information(self, "Готово", f"Проверка завершена!\nФайл сохранен: {output_file}")
+            with open_report(file_name) as report:
+                report.write_rows(list(self.check_model.rows), list(self.normativ_model.rows))
         except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка сохранения файла: {str(e)}")
+            QMessageBox.critical(self, "Ошибка", f"Ошибка при сохранении: {e}")
+            return
+        QMessageBox.information(self, "Готово", f"Файл сохранен: {file_name}")
+
+    def on_task_finished(self, check_count, normativ_count):
+        output_file = self.output_file
+        res = time.time() - self.started
+        if self.scanner.last_metrics is not None:
+            try:
+                self.scanner.last_metrics.save(METRICS_FILE)
+            except OSError as e:
+                print(f"Не удалось сохранить замеры: {e}")
+        self.partial = False
+        self.label.setText(f"Выполнено за {round(res, 2)} секунд!\nСохранено в:\n{output_file}")
+        QMessageBox.information(self, "Готово", f"Проверка завершена!\nФайл сохранен: {output_file}")
         self.progress_bar.setVisible(False)
+        self.button_cancel.setVisible(False)
         self.button_check.setEnabled(True)
 
+    def start_watch(self, path, month):
+        self.output_file = default_output_file(month)
+        self.watcher = LocalWatcher(self.scanner, path, month, on_update=self.watch_updated.emit)
+        self.button_check.setText("Остановить слежение")
+        self.label.setText("Выполняется проверка...")
+        # первый обход идет в отдельном потоке, дальше наблюдатель работает сам
+        threading.Thread(target=self.run_watcher, args=(self.watcher,), daemon=True).start()
+
+    def run_watcher(self, watcher):
+        try:
+            watcher.start()
+        except Exception as e:
+            self.watch_failed.emit(str(e))
+
+    def on_watch_updated(self, check_data, normativ_data):
+        self.partial = False
+        self.check_model.set_rows(check_data)
+        self.normativ_model.set_rows(normativ_data)
+        self.button_export.setVisible(True)
+        self.label.setText(f"Актуально на {time.strftime('%H:%M:%S')}\n"
+                           f"Оперативных проверок: {len(check_data)}, нормативов: {len(normativ_data)}")
+
+    def on_watch_failed(self, error_msg):
+        self.stop_watch()
+        self.on_task_error(error_msg)
+
+    def stop_watch(self):
+        watcher, self.watcher = self.watcher, None
+        if watcher is not None:
+            watcher.stop()
+        self.button_check.setText("Проверить")
+
+    def closeEvent(self, event):
+        self.stop_watch()
+        if self.worker_thread is not None and self.worker_thread.isRunning():
+            self.scanner.cancel()
+            self.worker_thread.wait()
+        super().closeEvent(event)
+
     def on_task_error(self, error_msg):
         QMessageBox.critical(self, "Ошибка", f"Ошибка при выполнении: {error_msg}")
         self.progress_bar.setVisible(False)
+        self.button_cancel.setVisible(False)
         self.button_check.setEnabled(True)
         self.label.setText("")
 
-    # ============ ЛОКАЛЬНЫЙ РЕЖИМ ============
-    def process_local(self, path, month, progress_callback=None):
-        check_data = []
-        normativ_data = []
-
-        if progress_callback:
-            progress_callback(5)
-
-        with os.scandir(path) as ech_entries:
-            ech_list = [entry for entry in ech_entries if entry.is_dir()]
-
-        total_ech = max(1, len(ech_list))
-
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            futures = {
-                executor.submit(self.process_ech_local, ech.path, ech.name): ech.name
-                for ech in ech_list
-            }
-            for idx, future in enumerate(as_completed(futures)):
-                try:
-                    ech_check_data, ech_normativ_data = future.result()
-                    check_data.extend(ech_check_data)
-                    normativ_data.extend(ech_normativ_data)
-                except Exception as e:
-                    print(f"Ошибка обработки ЭЧ: {e}")
-                if progress_callback:
-                    progress_callback(5 + int(90 * (idx + 1) / total_ech))
-
-        df_check = pd.DataFrame(check_data, columns=["ЭЧ", "Руководитель", "Норматив", "Где проводились", "Наличие видео ОП"])
-        df_normativ = pd.DataFrame(normativ_data, columns=["ЭЧ", "Руководитель", "Норматив", "Наличие материалов"])
-
-        if progress_callback:
-            progress_callback(100)
-        return (df_check, df_normativ)
-
-    def process_ech_local(self, ech_path, ech_name):
-        check_data = []
-        normativ_data = []
-        try:
-            with os.scandir(ech_path) as person_entries:
-                for person in person_entries:
-                    if not person.is_dir():
-                        continue
-                    person_path = person.path
-                    with os.scandir(person_path) as normativ_entries:
-                        for normativ in normativ_entries:
-                            if not normativ.is_dir():
-                                continue
-                            normativ_path = normativ.path
-                            if 'оперативные проверки' in normativ.name.lower():
-                                check_count = 0
-                                with os.scandir(normativ_path) as check_entries:
-                                    for check in check_entries:
-                                        if not check.is_dir() or check.name == '01.08 ЭЧК-№':
-                                            continue
-                                        has_video = self.has_video_files_local(check.path)
-                                        check_data.append([ech_name, person.name, normativ.name, check.name, 1 if has_video else 0])
-                                        check_count += 1
-                                while check_count < 3:
-                                    check_data.append([ech_name, person.name, normativ.name, '!!!Нет проверки', 0])
-                                    check_count += 1
-                                if check_count < 4 and 'ЭЧ ' not in person.name and 'ЭЧ-% ' not in person.name:
-                                    check_data.append([ech_name, person.name, normativ.name, 'Нет проверки', 0])
-                            else:
-                                has_materials = len(os.listdir(normativ_path)) > 0
-                                normativ_data.append([ech_name, person.name, normativ.name, 1 if has_materials else 0])
-        except Exception as e:
-            print(f"Ошибка обработки {ech_name}: {e}")
-        return (check_data, normativ_data)
-
-    def has_video_files_local(self, folder_path):
-        try:
-            with os.scandir(folder_path) as entries:
-                for entry in entries:
-                    if entry.is_file() and os.path.splitext(entry.name)[1] in self.VIDEO_EXTENSIONS:
-                        return True
-        except Exception:
-            pass
-        return False
-
-    # ============ FTP РЕЖИМ ============
-    def parse_ftp_url_with_cyrillic(self, ftp_url: str):
-        ftp_url = ftp_url.strip()
-        if not ftp_url.startswith('ftp://'):
-            raise ValueError("URL должен начинаться с ftp://")
-        rest = ftp_url[6:]
-        if '/' in rest:
-            host_port, path = rest.split('/', 1)
-            path = '/' + path
-        else:
-            host_port = rest
-            path = '/'
-        if ':' in host_port:
-            host, port_str = host_port.rsplit(':', 1)
-            try:
-                port = int(port_str)
-            except ValueError:
-                port = 21
-        else:
-            host = host_port
-            port = 21
-        try:
-            decoded_path = unquote(path, encoding='cp1251', errors='strict')
-        except Exception:
-            decoded_path = path
-        parts = [p for p in decoded_path.split('/') if p]
-        normalized_path = '/' + '/'.join(parts) if parts else '/'
-        return host, port, normalized_path
-
-    def process_ftp(self, ftp_url, month, ftp_login, ftp_password, progress_callback=None):
-        try:
-            host, port, ftp_path = self.parse_ftp_url_with_cyrillic(ftp_url)
-            if not host:
-                raise ValueError("Некорректный FTP URL!")
-
-            ftp = FTP()
-            ftp.connect(host, port, timeout=30)
-            ftp.login(ftp_login, ftp_password)
-            ftp.encoding = 'cp1251'  # критично для Serv-U и кириллицы
-
-            if progress_callback:
-                progress_callback(5)
-
-            # Пошаговая навигация по пути
-            if ftp_path != '/':
-                parts = [p for p in ftp_path.split('/') if p]
-                for part in parts:
-                    try:
-                        ftp.cwd(part)
-                    except all_errors:
-                        # fallback: ищем через LIST
-                        items = []
-                        ftp.retrlines('LIST', items.append)
-                        found = False
-                        for item in items:
-                            cols = item.split()
-                            if len(cols) >= 9 and cols[0].startswith('d'):
-                                folder_name = ' '.join(cols[8:])
-                                if folder_name.lower() == part.lower() or folder_name == part:
-                                    ftp.cwd(folder_name)
-                                    found = True
-                                    break
-                        if not found:
-                            raise ValueError(f"Не удалось найти папку: {part}")
-
-            base_path = ftp.pwd()
-            check_data = []
-            normativ_data = []
-
-            ech_list = self.get_ftp_folders(ftp)
-            total_ech = max(1, len(ech_list))
-
-            for idx, ech_name in enumerate(ech_list):
-                try:
-                    ech_path = f"{base_path}/{ech_name}".replace('//', '/')
-                    ftp.cwd(ech_path)
-
-                    person_list = self.get_ftp_folders(ftp)
-                    for person_name in person_list:
-                        person_path = f"{ech_path}/{person_name}".replace('//', '/')
-                        ftp.cwd(person_path)
-
-                        normativ_list = self.get_ftp_folders(ftp)
-                        for normativ_name in normativ_list:
-                            normativ_path = f"{person_path}/{normativ_name}".replace('//', '/')
-                            ftp.cwd(normativ_path)
-
-                            if 'оперативные проверки' in normativ_name.lower():
-                                check_count = 0
-                                check_list = [f for f in self.get_ftp_folders(ftp) if f != '01.08 ЭЧК-№']
-                                for check_name in check_list:
-                                    check_path = f"{normativ_path}/{check_name}".replace('//', '/')
-                                    has_video = self.has_video_files_ftp(ftp, check_path)
-                                    check_data.append([ech_name, person_name, normativ_name, check_name, 1 if has_video else 0])
-                                    check_count += 1
-                                while check_count < 3:
-                                    check_data.append([ech_name, person_name, normativ_name, '!!!Нет проверки', 0])
-                                    check_count += 1
-                                if check_count < 4 and 'ЭЧ ' not in person_name and 'ЭЧ-% ' not in person_name:
-                                    check_data.append([ech_name, person_name, normativ_name, 'Нет проверки', 0])
-                            else:
-                                files = self.get_ftp_files(ftp, normativ_path)
-                                has_materials = len(files) > 0
-                                normativ_data.append([ech_name, person_name, normativ_name, 1 if has_materials else 0])
-
-                            ftp.cwd(person_path)
-                        ftp.cwd(ech_path)
-                    ftp.cwd(base_path)
-                except Exception as e:
-                    print(f"Ошибка обработки {ech_name}: {e}")
-
-                if progress_callback:
-                    progress_callback(5 + int(90 * (idx + 1) / total_ech))
-
-            ftp.quit()
-
-            df_check = pd.DataFrame(check_data, columns=["ЭЧ", "Руководитель", "Норматив", "Где проводились", "Наличие видео ОП"])
-            df_normativ = pd.DataFrame(normativ_data, columns=["ЭЧ", "Руководитель", "Норматив", "Наличие материалов"])
-
-            if progress_callback:
-                progress_callback(100)
-            return (df_check, df_normativ)
-
-        except Exception as e:
-            raise Exception(f"Ошибка FTP: {str(e)}")
-
-    def get_ftp_folders(self, ftp: FTP):
-        items = []
-        ftp.retrlines('LIST', items.append)
-        folders = []
-        for item in items:
-            parts = item.split()
-            if len(parts) >= 9 and parts[0].startswith('d'):
-                folder_name = ' '.join(parts[8:])
-                folders.append(folder_name)
-        return folders
-
-    def get_ftp_files(self, ftp: FTP, path: str):
-        ftp.cwd(path)
-        items = []
-        ftp.retrlines('LIST', items.append)
-        files = []
-        for item in items:
-            parts = item.split()
-            if len(parts) >= 9 and not parts[0].startswith('d'):
-                filename = ' '.join(parts[8:])
-                files.append(filename)
-        return files
-
-    def has_video_files_ftp(self, ftp: FTP, folder_path: str):
-        try:
-            files = self.get_ftp_files(ftp, folder_path)
-            for filename in files:
-                if os.path.splitext(filename)[1] in self.VIDEO_EXTENSIONS:
-                    return True
-        except Exception:
-            pass
-        return False
-
-app = QApplication(sys.argv)
-window = MainWindow()
-window.show()
-app.exec()
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    window.show()
+    app.exec()
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+@pytest.fixture
+def ftp_tree(tmp_path, monkeypatch):
+    """Синтетическое дерево из benchmarks, розданное локальным FTP:
+    (локальный корень, URL, логин, пароль)."""
+    pytest.importorskip('pyftpdlib')
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'benchmarks'))
+    from ftp_server import PASSWORD, USER, BenchFtpServer
+    from synthetic_tree import make_tree
+
+    root = tmp_path / 'tree'
+    root.mkdir()
+    make_tree(str(root), ech_count=3, persons=3, normativs=3)
+    # кэш листингов, журнал и уровни соединений пишутся в текущую папку
+    monkeypatch.chdir(tmp_path)
+    server = BenchFtpServer(str(root)).start()
+    yield (str(root), server.url, USER, PASSWORD)
+    server.stop()
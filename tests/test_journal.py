@@ -0,0 +1,92 @@
+"""Журнал прерванного прогона FTP: когда он остается и когда продолжается."""
+import os
+import time
+from ftplib import error_perm
+
+import pytest
+
+from inspection.engine import Scanner
+from inspection.journal import ScanJournal
+from inspection.traversal import AsyncPoolBackend, FtpBackend
+
+MONTH = 'май 2024'
+
+
+def ftp_path(root, path):
+    return '/' + os.path.relpath(path, root).replace(os.sep, '/')
+
+
+def normativ_folders(root, ech):
+    """Папки нормативов ЭЧ (не оперативных проверок) в порядке имен."""
+    folders = []
+    for person in sorted(os.listdir(os.path.join(root, ech))):
+        for normativ in sorted(os.listdir(os.path.join(root, ech, person))):
+            if not Scanner().is_check_folder(normativ):
+                folders.append(os.path.join(root, ech, person, normativ))
+    return folders
+
+
+def deny_listing(monkeypatch, denied, error):
+    """Листинг папки denied (путь FTP) падает с error в обоих движках."""
+    list_dir = FtpBackend.list_dir
+    async_list_dir = AsyncPoolBackend.list_dir
+
+    def sync_wrapper(self, path):
+        if path == denied:
+            raise error
+        return list_dir(self, path)
+
+    async def async_wrapper(self, path):
+        if path == denied:
+            raise error
+        return await async_list_dir(self, path)
+
+    monkeypatch.setattr(FtpBackend, 'list_dir', sync_wrapper)
+    monkeypatch.setattr(AsyncPoolBackend, 'list_dir', async_wrapper)
+
+
+@pytest.mark.parametrize('engine', ['threads', 'async'])
+def test_folder_error_does_not_freeze_report(ftp_tree, monkeypatch, engine):
+    root, url, user, password = ftp_tree
+    with monkeypatch.context() as patch:
+        deny_listing(patch, ftp_path(root, normativ_folders(root, 'ЭЧ-2')[0]), error_perm('550 Permission denied.'))
+        scanner = Scanner()
+        scanner.process_ftp(url, MONTH, user, password, engine=engine)
+        assert scanner.last_metrics.extra['failed_ech'] == ['ЭЧ-2']
+    # обход дошел до конца: журнал не нужен, несмотря на ошибку папки
+    assert not os.path.exists(Scanner.JOURNAL_FILE)
+
+    # материалы ЭЧ-1 удалены: следующий прогон видит это, а не строки журнала
+    changed = next(path for path in normativ_folders(root, 'ЭЧ-1') if os.listdir(path))
+    for name in os.listdir(changed):
+        os.remove(os.path.join(changed, name))
+    stamp = time.time() - 3600
+    os.utime(changed, (stamp, stamp))
+    _, expected = Scanner().process_local(root, MONTH, force_rescan=True)
+    _, df_normativ = Scanner().process_ftp(url, MONTH, user, password, engine=engine)
+    assert df_normativ.values.tolist() == expected.values.tolist()
+
+
+@pytest.mark.parametrize('engine', ['threads', 'async'])
+def test_journal_kept_when_connection_lost(ftp_tree, monkeypatch, engine):
+    root, url, user, password = ftp_tree
+    deny_listing(monkeypatch, ftp_path(root, normativ_folders(root, 'ЭЧ-2')[0]), ConnectionResetError('reset'))
+    scanner = Scanner()
+    scanner.FTP_RECONNECT_ATTEMPTS = 0
+    scanner.process_ftp(url, MONTH, user, password, engine=engine)
+    assert scanner.last_metrics.extra['failed_ech'] == ['ЭЧ-2']
+    # прерванный прогон продолжается: записаны хотя бы остальные ЭЧ
+    records = ScanJournal.load(Scanner.JOURNAL_FILE, f'{url}|{MONTH}')
+    assert {record['ech'] for record in records if 'ech' in record} == {'ЭЧ-1', 'ЭЧ-3'}
+
+
+def test_stale_journal_is_not_resumed(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = ScanJournal(path, 'ftp://host:21/', MONTH)
+    journal.record_ech('ЭЧ-1', [], [['ЭЧ-1', 'ЭЧС Петров', '01 Охрана труда', 1]])
+    journal.close(completed=False)
+    assert ScanJournal(path, 'ftp://host:21/', MONTH, max_age=3600).resuming
+
+    stamp = time.time() - 7200
+    os.utime(path, (stamp, stamp))
+    assert not ScanJournal(path, 'ftp://host:21/', MONTH, max_age=3600).resuming
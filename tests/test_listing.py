@@ -0,0 +1,68 @@
+"""Кэш листингов между прогонами."""
+from datetime import datetime
+
+import pytest
+
+from inspection import ftp
+from inspection.engine import Scanner
+
+MONTH = 'май 2024'
+
+
+@pytest.mark.parametrize('engine', ['threads', 'async'])
+def test_cache_hits_survive_warm_runs(ftp_tree, engine):
+    _, url, user, password = ftp_tree
+    hits = []
+    listings = []
+    for _ in range(3):
+        scanner = Scanner()
+        scanner.process_ftp(url, MONTH, user, password, engine=engine)
+        hits.append(scanner.last_metrics.extra['cache_hits'])
+        listings.append(scanner.last_metrics.summary()['listings'])
+    assert hits[0] == 0
+    # дерево не менялось: каждый теплый прогон берет листинги из кэша
+    assert hits[1] > 0 and hits[2] == hits[1]
+    assert listings[2] == listings[1] < listings[0]
+
+
+def test_evict_cache_from_cli(tmp_path, monkeypatch):
+    from inspection.cli import main
+    from inspection.listing import ListingCache
+
+    monkeypatch.chdir(tmp_path)
+    root = str(tmp_path / 'tree')
+    for scope_root, month in [(root, 'апрель 2024'), (root, MONTH), ('ftp://host:21/', MONTH)]:
+        cache = ListingCache(Scanner.LISTING_CACHE_FILE, scope_root, month)
+        cache.store('/ЭЧ-1', 1, [])
+        cache.save()
+
+    assert main(['--evict-cache', '--path', root, '--month', MONTH]) == 0
+    assert set(ListingCache.load(Scanner.LISTING_CACHE_FILE)) == {'format', f'{root}|апрель 2024',
+                                                                   f'ftp://host:21/|{MONTH}'}
+    assert main(['--evict-cache', '--path', 'ftp://host/']) == 0
+    assert set(ListingCache.load(Scanner.LISTING_CACHE_FILE)) == {'format', f'{root}|апрель 2024'}
+
+
+
+NOW = datetime(2024, 5, 31, 10, 30, 20)
+
+
+@pytest.mark.parametrize('stamp, settled', [
+    # та же минута, что и листинг: файл, добавленный следом, отметку не сменит
+    ('May 31 10:30', False),
+    ('05-31-24 10:30AM', False),
+    ('May 28 09:15', True),
+    ('Dec 30 23:59', True),
+    ('May 12 2023', True),
+    ('05-12-24 10:30PM', True),
+    ('Мая 12 10:30', False),
+])
+def test_recent_list_stamps_are_not_cached(stamp, settled):
+    assert ftp.settled_stamp(stamp, NOW) == (stamp if settled else None)
+
+
+def test_list_stamps_of_files_are_kept():
+    # файлам отметка нужна для подписи видео, а не для кэша папки
+    today = datetime.now().strftime('%b %d %H:%M')
+    assert ftp.parse_list_line(f'-rw-r--r-- 1 user group 10 {today} запись.mp4').modify == today
+    assert ftp.parse_list_line(f'drwxr-xr-x 1 user group 0 {today} Проверка 1').modify is None
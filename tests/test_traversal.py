@@ -0,0 +1,157 @@
+"""Правила отчета в TreeWalker и совпадение строк всех движков обхода.
+
+Правила проверяются на дереве в памяти (MemoryBackend), без диска и
+сервера. Сверка движков строит синтетическое дерево из benchmarks и
+раздает его локальным FTP (фикстура ftp_tree из conftest.py); без
+pyftpdlib она пропускается.
+
+    pip install pytest -r benchmarks/requirements.txt
+    python -m pytest tests
+"""
+import pytest
+
+from inspection.engine import Scanner
+from inspection.traversal import LocalBackend, MemoryBackend, TreeWalker
+
+ECH = 'ЭЧ-1'
+CHECKS = '02 Оперативные проверки'
+MP4_HEADER = b'\0\0\0\x18ftypisom'
+
+
+def folder(name):
+    return (name, True, 0, None)
+
+
+def file(name, size=10):
+    return (name, False, size, None)
+
+
+def person_tree(person, checks=None, normativs=None):
+    """Дерево одной ЭЧ с одним руководителем. checks — {имя проверки: файлы},
+    normativs — {имя норматива: записи}."""
+    checks = checks or {}
+    normativs = normativs or {}
+    person_path = f'/{ECH}/{person}'
+    tree = {
+        '/': [folder(ECH)],
+        f'/{ECH}': [folder(person)],
+        person_path: [folder(name) for name in normativs] + [folder(CHECKS)],
+        f'{person_path}/{CHECKS}': [folder(name) for name in checks],
+    }
+    for name, entries in normativs.items():
+        tree[f'{person_path}/{name}'] = entries
+    for name, entries in checks.items():
+        tree[f'{person_path}/{CHECKS}/{name}'] = entries
+    return tree
+
+
+def walk(tree, scanner=None, headers=None, materials='files'):
+    scanner = scanner or Scanner()
+    return TreeWalker(scanner, MemoryBackend(tree, headers, materials)).rows('/')
+
+
+def check_names(check_data):
+    return [row[3] for row in check_data]
+
+
+# ---------- дополнение до 3/4 проверок ----------
+def test_padding_to_four_checks():
+    check_data, _ = walk(person_tree('ЭЧС Петров', {'Проверка 1': [file('запись.mp4')]}))
+    assert check_names(check_data) == ['Проверка 1', '!!!Нет проверки', '!!!Нет проверки', 'Нет проверки']
+    assert [row[4] for row in check_data] == [1, 0, 0, 0]
+
+
+def test_no_padding_with_four_checks():
+    checks = {f'Проверка {i}': [] for i in range(1, 5)}
+    check_data, _ = walk(person_tree('ЭЧС Петров', checks))
+    assert check_names(check_data) == list(checks)
+
+
+@pytest.mark.parametrize('person', ['ЭЧ Иванов', 'ЭЧ-% Сидоров'])
+def test_heads_padded_to_three_checks(person):
+    check_data, _ = walk(person_tree(person, {'Проверка 1': []}))
+    assert check_names(check_data) == ['Проверка 1', '!!!Нет проверки', '!!!Нет проверки']
+
+
+def test_skipped_check_folder():
+    checks = {Scanner.SKIPPED_CHECK_FOLDER: [file('запись.mp4')], 'Проверка 1': []}
+    check_data, _ = walk(person_tree('ЭЧ Иванов', checks))
+    assert Scanner.SKIPPED_CHECK_FOLDER not in check_names(check_data)
+    assert check_names(check_data) == ['Проверка 1', '!!!Нет проверки', '!!!Нет проверки']
+
+
+# ---------- материалы ----------
+NORMATIVS = {
+    '01 Охрана труда': [file('акт.pdf')],
+    '03 Пожарная безопасность': [folder('фото')],
+    '04 Обход участка': [],
+}
+
+
+def materials(normativ_data):
+    return {row[2]: row[3] for row in normativ_data}
+
+
+def test_materials_files_rule():
+    _, normativ_data = walk(person_tree('ЭЧС Петров', normativs=NORMATIVS))
+    assert materials(normativ_data) == {'01 Охрана труда': 1, '03 Пожарная безопасность': 0, '04 Обход участка': 0}
+
+
+def test_materials_entries_rule():
+    _, normativ_data = walk(person_tree('ЭЧС Петров', normativs=NORMATIVS), materials='entries')
+    assert materials(normativ_data) == {'01 Охрана труда': 1, '03 Пожарная безопасность': 1, '04 Обход участка': 0}
+
+
+def test_materials_rule_override():
+    scanner = Scanner()
+    scanner.MATERIALS_RULE = 'files'
+    _, normativ_data = walk(person_tree('ЭЧС Петров', normativs=NORMATIVS), scanner, materials='entries')
+    assert materials(normativ_data)['03 Пожарная безопасность'] == 0
+
+
+# ---------- проверка видео ----------
+VIDEO_CHECKS = {
+    'Маленький файл': [file('запись.mp4', 10)],
+    'Большой файл': [file('запись.mp4', Scanner.VIDEO_MIN_SIZE)],
+    'Размер неизвестен': [file('запись.MOV', None)],
+    'Без видео': [file('акт.pdf', Scanner.VIDEO_MIN_SIZE)],
+}
+VIDEO_PATH = f'/{ECH}/ЭЧС Петров/{CHECKS}'
+HEADERS = {
+    f'{VIDEO_PATH}/Большой файл/запись.mp4': MP4_HEADER + b'\0' * 64,
+    f'{VIDEO_PATH}/Размер неизвестен/запись.MOV': b'%PDF' + b'\0' * 64,
+}
+
+
+@pytest.mark.parametrize('mode, expected', [
+    ('extension', {'Маленький файл': 1, 'Большой файл': 1, 'Размер неизвестен': 1, 'Без видео': 0}),
+    ('size', {'Маленький файл': 0, 'Большой файл': 1, 'Размер неизвестен': 1, 'Без видео': 0}),
+    ('header', {'Маленький файл': 0, 'Большой файл': 1, 'Размер неизвестен': 0, 'Без видео': 0}),
+])
+def test_video_modes(mode, expected):
+    scanner = Scanner()
+    scanner.VIDEO_VALIDATION = mode
+    check_data, _ = walk(person_tree('ЭЧС Петров', VIDEO_CHECKS), scanner, HEADERS)
+    assert {row[3]: row[4] for row in check_data if row[3] in VIDEO_CHECKS} == expected
+
+
+# ---------- совпадение движков ----------
+def test_engines_produce_same_rows(ftp_tree):
+    root, url, user, password = ftp_tree
+    df_check, df_normativ = Scanner().process_local(root, 'май 2024', force_rescan=True)
+    expected = (df_check.values.tolist(), df_normativ.values.tolist())
+    assert expected[0] and expected[1]
+    for engine in ('threads', 'async'):
+        df_check, df_normativ = Scanner().process_ftp(url, 'май 2024', user, password, engine=engine,
+                                                      force_rescan=True)
+        assert (df_check.values.tolist(), df_normativ.values.tolist()) == expected, engine
+
+
+@pytest.mark.parametrize('mode, size', [('extension', None), ('size', 10)])
+def test_local_video_stat_only_when_needed(tmp_path, mode, size):
+    (tmp_path / 'запись.mp4').write_bytes(b'\0' * 10)
+    scanner = Scanner()
+    scanner.VIDEO_VALIDATION = mode
+    [entry] = LocalBackend(scanner).list_dir(str(tmp_path))
+    # по расширению размер не нужен, и stat на сетевом диске не делается
+    assert entry.size == size